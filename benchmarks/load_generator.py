@@ -0,0 +1,568 @@
+"""
+Offline load generator that replays the traffic of a busy PUG server through PugQueueCog, without Discord.
+
+A fake guild of members clicks the queue buttons, chats, goes offline and comes back at the given rates. The cog's
+AFK and offline checks run on their own interval, full queues start games and captains `!end` them after a while.
+Every operation's latency is recorded, along with how late the event loop runs a timer (its lag), which shows
+when synchronous work such as balancing or a rating replay holds up everything else.
+
+Nothing leaves the machine:
+  * Discord calls (messages, edits, reactions, DMs) are fakes that wait --api-latency before returning.
+  * The stats API is a local HTTP server serving synthetic games, plus a game for every game ended during the run,
+    which the bot reaches through the GAMES_URL environment variable.
+  * The TA login server query (`node ta-network-api/index.js`) is replaced by a generated script that prints a
+    changing server list, which the bot runs through the NODE_PATH environment variable.
+The queue state, game caches and other files the cogs write go to a temporary directory.
+
+Usage (from the directory holding the bot's config.ini, normally the repository root):
+    python benchmarks/load_generator.py --duration 120 --members 300 --click-rate 4 --chat-rate 10
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextvars
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+import discord
+from discord.ext import commands
+
+from benchmarks.synthetic import SEED, generate_games, generate_members
+
+GUILD_ID = 900000000000000001
+CHANNEL_ID = 900000000000000002
+QUEUES = {'PUGz': 14, '2v2': 4}
+API_QUEUE_NAMES = {'PUGz': 'PUGz', '2v2': '2v2'}  # Stats API queue of the games each queue starts
+
+# How often the event loop lag is sampled, in seconds
+LAG_SAMPLE_INTERVAL = 0.05
+
+# Printed by the TA login server stub: one CTF server whose clock and scores move with the wall clock
+TA_LOGIN_STUB = '''#!{python}
+import json, time
+elapsed = int(time.time()) % 1500
+players = [{{"name": "player%d" % i, "team": i % 2}} for i in range(14)] if elapsed < 1200 else []
+print(json.dumps([{{
+    "id": 1, "name": "PUG Server", "numberOfPlayers": len(players), "maxNumberOfPlayers": 14,
+    "map": {{"name": "Katabatic", "gamemode": "CTF"}}, "timeRemaining": max(0, 1200 - elapsed),
+    "scores": {{"bloodEagle": elapsed // 300, "diamondSword": elapsed // 400}}, "players": players
+}}]))
+'''
+
+# Set while a game start is in progress, so the fake bot can time it up to the posted teams
+game_start = contextvars.ContextVar('game_start', default=None)
+
+
+class LatencyRecorder:
+    """Durations in seconds, by operation."""
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, operation, seconds):
+        self.samples.setdefault(operation, []).append(seconds)
+
+    def summarize(self):
+        summary = {}
+        for operation, samples in sorted(self.samples.items()):
+            milliseconds = 1000 * np.array(samples)
+            summary[operation] = {
+                'count': len(samples),
+                'mean_ms': float(milliseconds.mean()),
+                'p50_ms': float(np.percentile(milliseconds, 50)),
+                'p95_ms': float(np.percentile(milliseconds, 95)),
+                'p99_ms': float(np.percentile(milliseconds, 99)),
+                'max_ms': float(milliseconds.max())
+            }
+        return summary
+
+
+class StatsApiStub:
+    """The stats API's game list, served over HTTP from a background thread."""
+    def __init__(self, games):
+        self.games = games
+        self.lock = threading.Lock()
+        self.body = json.dumps(games).encode()
+        self.requests = 0
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with stub.lock:
+                    body = stub.body
+                    stub.requests += 1
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/api/server/{GUILD_ID}/games"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def add_game(self, game):
+        with self.lock:
+            self.games.append(game)
+            self.body = json.dumps(self.games).encode()
+
+    def close(self):
+        self.server.shutdown()
+
+
+def write_ta_login_stub(directory):
+    filepath = os.path.join(directory, 'ta_login_stub.py')
+    with open(filepath, 'w') as f:
+        f.write(TA_LOGIN_STUB.format(python=sys.executable))
+    os.chmod(filepath, 0o755)
+    return filepath
+
+
+class FakeApi:
+    """Stands in for Discord's REST API: every call takes about latency seconds and is counted."""
+    def __init__(self, latency, rng):
+        self.latency = latency
+        self.rng = rng
+        self.calls = {}
+
+    async def call(self, route):
+        self.calls[route] = self.calls.get(route, 0) + 1
+        if self.latency:
+            await asyncio.sleep(max(0.0, self.rng.gauss(self.latency, self.latency / 4)))
+
+
+class FakeMessage:
+    def __init__(self, api, message_id, channel, author, content=None, embed=None, view=None):
+        self.api = api
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.embeds = [embed] if embed else []
+        self.view = view
+
+    async def edit(self, embed=None, **kwargs):
+        await self.api.call('edit_message')
+        if embed:
+            self.embeds = [embed]
+
+    async def add_reaction(self, emoji):
+        await self.api.call('add_reaction')
+
+    async def delete(self):
+        await self.api.call('delete_message')
+
+
+class FakeChannel:
+    def __init__(self, api, channel_id, guild=None, name='pugs', bot_user=None):
+        self.api = api
+        self.id = channel_id
+        self.guild = guild
+        self.name = name
+        self.bot_user = bot_user
+        self.message_ids = iter(range(channel_id * 1000, channel_id * 1000 + 10 ** 9))
+        self.menu = None  # The latest message with the queue buttons
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        await self.api.call('send_message')
+        message = FakeMessage(self.api, next(self.message_ids), self, self.bot_user, content, embed, view)
+        if view is not None:
+            self.menu = message
+        return message
+
+    async def history(self, limit=100, before=None):
+        # A new channel, so the map history backfill finds nothing
+        await self.api.call('channel_history')
+        return
+        yield
+
+
+class FakeMember:
+    def __init__(self, api, member_id, name, display_name, guild=None, bot=False):
+        self.api = api
+        self.id = member_id
+        self.name = name
+        self.display_name = display_name
+        self.guild = guild
+        self.bot = bot
+        self.status = discord.Status.online
+        self.dm_channel = None
+
+    @property
+    def mention(self):
+        return f"<@{self.id}>"
+
+    async def create_dm(self):
+        await self.api.call('create_dm')
+        self.dm_channel = FakeChannel(self.api, self.id, name=f"dm-{self.id}")
+        return self.dm_channel
+
+    async def send(self, content=None, embed=None, **kwargs):
+        channel = self.dm_channel or await self.create_dm()
+        return await channel.send(content, embed=embed)
+
+
+class FakeGuild:
+    def __init__(self, guild_id, members=()):
+        self.id = guild_id
+        self.members = list(members)
+        self.members_by_id = {member.id: member for member in self.members}
+
+    def get_member(self, member_id):
+        return self.members_by_id.get(int(member_id))
+
+
+class FakeContext:
+    """The parts of commands.Context the queue commands use."""
+    def __init__(self, bot, guild, channel, author):
+        self.bot = bot
+        self.guild = guild
+        self.channel = channel
+        self.author = author
+
+    async def send(self, content=None, embed=None, view=None, **kwargs):
+        return await self.channel.send(content, embed=embed, view=view)
+
+
+class FakeResponse:
+    def __init__(self, api):
+        self.api = api
+
+    async def send_message(self, content=None, embed=None, ephemeral=False, **kwargs):
+        await self.api.call('interaction_response')
+
+
+class FakeInteraction(discord.Interaction):
+    """A button click. Subclasses discord.Interaction, since the cog's on_interaction listener checks for one."""
+    guild = None  # A property on discord.Interaction
+
+    def __init__(self, api, user, guild, message):
+        self.user = user
+        self.guild = guild
+        self.message = message
+        self.channel = message.channel
+        self.response = FakeResponse(api)
+
+
+class OfflineBot(commands.Bot):
+    """A bot that never connects: guilds, users and channels come from the fakes."""
+    def __init__(self, api, guild, channel, recorder):
+        super().__init__(command_prefix='!', intents=discord.Intents.default())
+        self.api = api
+        self.guild = guild
+        self.channel = channel
+        self.recorder = recorder
+        self.closing = asyncio.get_running_loop().create_future()
+
+    def get_guild(self, guild_id):
+        return self.guild if int(guild_id) == self.guild.id else None
+
+    def get_user(self, user_id):
+        return self.guild.get_member(user_id)
+
+    def get_channel(self, channel_id):
+        return self.channel if int(channel_id) == self.channel.id else None
+
+    async def change_presence(self, **kwargs):
+        await self.api.call('change_presence')
+
+    async def wait_for(self, event, check=None, timeout=None):
+        # Only the balanced teams message waits for reactions, so its game has been started
+        started = game_start.get()
+        if started is not None:
+            self.recorder.record('game start', time.perf_counter() - started)
+            game_start.set(None)
+        # Nobody votes to rebalance: wait until the run is over
+        await asyncio.shield(self.closing)
+        raise asyncio.CancelledError
+
+
+def isolate_state(directory, pug_queue, data_managment, map_history, ta_network):
+    """Point every file the cogs read or write at directory, so a run starts empty and leaves the bot's data alone."""
+    cache_dir = os.path.join(directory, 'cache')
+    queue_cache_dir = os.path.join(cache_dir, 'gamequeue')
+    queue_data_dir = os.path.join(directory, 'data', 'gamequeue')
+    for path in (queue_cache_dir, queue_data_dir):
+        os.makedirs(path, exist_ok=True)
+
+    pug_queue.CACHE_DIR = queue_cache_dir
+    pug_queue.DATA_DIR = queue_data_dir
+    pug_queue.AFK_TIMES_FILE = os.path.join(queue_data_dir, 'afk_times.bson')
+    pug_queue.BANS_FILE = os.path.join(queue_data_dir, 'bans.bson')
+    pug_queue.OFFLINE_CACHE_FILE = os.path.join(queue_cache_dir, 'offline_cache.bson')
+    pug_queue.OFFLINE_TIME_FILE = os.path.join(queue_data_dir, 'offline_times.bson')
+    data_managment.CACHE_DIR = cache_dir
+    map_history.MAP_HISTORY_FILE = os.path.join(directory, 'data', 'maps_with_times.json')
+    ta_network.CACHE_FILE_PATH = os.path.join(cache_dir, 'cache.json')
+    ta_network.DATA_DIR = os.path.join(directory, 'data')
+
+
+class LoadGenerator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.recorder = LatencyRecorder()
+        self.api = FakeApi(args.api_latency, random.Random(args.seed + 1))
+        self.tasks = set()
+        self.game_ends = {}  # Ongoing game id -> perf_counter time to end it at
+        self.games_ended = 0
+
+    def spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def timed(self, operation, coroutine):
+        start = time.perf_counter()
+        try:
+            await coroutine
+        except Exception as e:
+            self.recorder.record(f"{operation} (failed)", time.perf_counter() - start)
+            print(f"{operation} failed: {e!r}")
+            return
+        self.recorder.record(operation, time.perf_counter() - start)
+
+    async def every(self, interval, action, overlap=True):
+        """Start action every interval seconds, or run it and then wait interval seconds if runs mustn't overlap."""
+        while True:
+            await asyncio.sleep(interval)
+            if overlap:
+                self.spawn(action())
+            else:
+                await action()
+
+    async def poisson(self, rate, action):
+        """Start action at random times, rate times a second on average, without waiting for earlier ones (open loop)."""
+        if rate <= 0:
+            return
+        while True:
+            await asyncio.sleep(self.rng.expovariate(rate))
+            self.spawn(action())
+
+    async def measure_lag(self):
+        while True:
+            expected = time.perf_counter() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            self.recorder.record('event loop lag', max(0.0, time.perf_counter() - expected))
+
+    def get_queued(self):
+        queues = self.pug_queue.get_current_queues().get(str(GUILD_ID), {}).get(str(CHANNEL_ID), {})
+        return {queue_name: {player_id for player_id, _ in queue['members']} for queue_name, queue in queues.items()}
+
+    async def click(self):
+        menu = self.channel.menu
+        if menu is None:
+            return
+        queued = self.get_queued()
+        button = self.rng.choice(menu.view.children)
+        members = queued.get(button.label, set())
+        if members and self.rng.random() < self.args.leave_fraction:
+            member = self.guild.get_member(self.rng.choice(sorted(members)))
+        else:
+            member = self.rng.choice(self.guild.members)
+        interaction = FakeInteraction(self.api, member, self.guild, menu)
+
+        # Discord hands a click to the interaction listeners and to the button's view
+        await self.timed('click', asyncio.gather(self.cog.on_interaction(interaction), button.callback(interaction)))
+
+    async def chat(self):
+        author = self.rng.choice(self.guild.members)
+        message = FakeMessage(self.api, next(self.channel.message_ids), self.channel, author, content="gg")
+        await self.timed('chat', self.cog.on_message(message))
+
+    async def toggle_status(self):
+        member = self.rng.choice(self.guild.members)
+        member.status = discord.Status.offline if member.status != discord.Status.offline else discord.Status.online
+
+    async def check_afk(self):
+        await self.timed('afk check', self.cog.check_stale_users())
+
+    async def check_statuses(self):
+        await self.timed('offline check', self.cog.check_member_statuses())
+
+    async def poll_stats(self):
+        await self.timed('stats poll', self.cache_cog.update_queues_cache())
+
+    async def poll_servers(self):
+        await self.timed('server status poll', self.ta_cog.update_cache())
+
+    async def end_games(self):
+        """Have a captain `!end` each game once it has run its course, and report it to the stats API."""
+        now = time.perf_counter()
+        ongoing_games = self.load_from_bson(os.path.join(self.pug_queue.CACHE_DIR, 'ongoing_games.bson'))
+        for game_id, game in ongoing_games.items():
+            end_at = self.game_ends.setdefault(game_id, now + self.args.game_seconds * self.rng.uniform(0.5, 1.5))
+            if end_at > now:
+                continue
+            del self.game_ends[game_id]
+            captain = self.guild.get_member(game['captains'][0])
+            await self.timed('!end', self.cog.end(FakeContext(self.bot, self.guild, self.channel, captain)))
+            self.stats_api.add_game(self.make_api_game(game))
+            self.games_ended += 1
+
+    def make_api_game(self, game):
+        members = game['members']
+        captains = game['captains']
+        others = [member for member in members if member['id'] not in captains]
+        self.rng.shuffle(others)
+        players = [{'user': {'id': captain, 'name': self.guild.get_member(captain).name}, 'team': team, 'captain': 1, 'pickOrder': 0}
+                   for team, captain in zip((1, 2), captains)]
+        for pick_order, member in enumerate(others, start=1):
+            players.append({'user': {'id': member['id'], 'name': self.guild.get_member(member['id']).name},
+                            'team': 1 if pick_order % 4 in (0, 1) else 2, 'captain': 0, 'pickOrder': pick_order})
+        return {'timestamp': int(game['timestamp'] * 1000), 'completionTimestamp': int(time.time() * 1000),
+                'winningTeam': self.rng.choice((1, 2)), 'queue': {'id': 1, 'name': API_QUEUE_NAMES[game['queue_name']]},
+                'players': players}
+
+    async def setup(self, state_dir):
+        args = self.args
+        members = generate_members(args.members, args.seed)
+        users = [{'id': member_id, 'name': name} for member_id, name, _ in members]
+        history = generate_games(args.history_games, users, seed=args.seed)
+        history += generate_games(args.history_games // 4, users, team_size=2, queue_name='2v2', seed=args.seed)
+        history.sort(key=lambda game: game['timestamp'])
+        self.stats_api = StatsApiStub(history)
+
+        # Both are read when the bot's modules are imported
+        os.environ['GAMES_URL'] = self.stats_api.url
+        os.environ['NODE_PATH'] = write_ta_login_stub(state_dir)
+
+        from modules import data_managment, map_history
+        from cogs import pug_queue, ta_network
+        from cogs.cache_queues import QueueCacheCog
+        from cogs.pug_queue import PugQueueCog
+        from cogs.ta_network import TANetworkCog
+        isolate_state(state_dir, pug_queue, data_managment, map_history, ta_network)
+        self.pug_queue = pug_queue
+        self.load_from_bson = data_managment.load_from_bson
+        save_to_bson = data_managment.save_to_bson
+
+        self.guild = FakeGuild(GUILD_ID)
+        bot_user = FakeMember(self.api, 1, 'pugbot', 'PUG Bot', self.guild, bot=True)
+        self.channel = FakeChannel(self.api, CHANNEL_ID, self.guild, bot_user=bot_user)
+        for member_id, name, display_name in members:
+            member = FakeMember(self.api, member_id, name, display_name, self.guild)
+            self.guild.members.append(member)
+            self.guild.members_by_id[member_id] = member
+        self.bot = OfflineBot(self.api, self.guild, self.channel, self.recorder)
+
+        # The channel and queues an admin would set up with !setpugchannel and !createqueue
+        save_to_bson({str(GUILD_ID): str(CHANNEL_ID)}, os.path.join(pug_queue.DATA_DIR, 'pug_channel.bson'))
+        save_to_bson({str(GUILD_ID): {str(CHANNEL_ID): {name: {'size': size, 'members': []} for name, size in QUEUES.items()}}},
+                     os.path.join(pug_queue.CACHE_DIR, 'queues.bson'))
+        pug_queue.save_afk_time(GUILD_ID, CHANNEL_ID, args.afk_minutes)
+        pug_queue.save_offline_limits({str(GUILD_ID): {str(CHANNEL_ID): args.offline_minutes}})
+
+        # Time each game start from the click that filled the queue to the balanced teams being posted
+        start_game = pug_queue.start_game
+
+        async def timed_start_game(*start_args):
+            game_start.set(time.perf_counter())
+            await start_game(*start_args)
+        pug_queue.start_game = timed_start_game
+
+        self.cog = PugQueueCog(self.bot)
+        self.cache_cog = QueueCacheCog(self.bot)
+        self.ta_cog = TANetworkCog(self.bot)
+        # The cogs' own loops are replaced by the generator's, which run at the configured intervals
+        for loop in (self.cog.check_stale_users, self.cog.check_member_statuses, self.cache_cog.update_queues_cache,
+                     self.ta_cog.update_cache):
+            loop.cancel()
+        for cog in (self.cog, self.cache_cog, self.ta_cog):
+            await self.bot.add_cog(cog)
+
+        # Cache the queues' games and ratings before the traffic starts, as a running bot would have
+        await self.poll_stats()
+        await self.cog.menu(FakeContext(self.bot, self.guild, self.channel, self.guild.members[0]))
+
+    async def run(self):
+        args = self.args
+        with tempfile.TemporaryDirectory() as state_dir:
+            await self.setup(state_dir)
+            drivers = [
+                self.measure_lag(),
+                self.poisson(args.click_rate, self.click),
+                self.poisson(args.chat_rate, self.chat),
+                self.poisson(args.status_rate, self.toggle_status),
+                self.every(args.check_interval, self.check_afk),
+                self.every(args.check_interval, self.check_statuses),
+                self.every(1.0, self.end_games, overlap=False),
+                self.every(args.stats_interval, self.poll_stats),
+                self.every(args.server_interval, self.poll_servers),
+            ]
+            print(f"Running for {args.duration:g}s with {args.members} members...")
+            driver_tasks = [asyncio.create_task(driver) for driver in drivers]
+            start = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            elapsed = time.perf_counter() - start
+
+            for task in driver_tasks:
+                task.cancel()
+            self.bot.closing.set_result(None)
+            for task in list(self.tasks) + [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]:
+                task.cancel()
+            await asyncio.gather(*driver_tasks, *self.tasks, return_exceptions=True)
+            self.stats_api.close()
+
+        return {
+            'duration_s': elapsed,
+            'settings': vars(args),
+            'games_ended': self.games_ended,
+            'stats_api_requests': self.stats_api.requests,
+            'discord_api_calls': dict(sorted(self.api.calls.items())),
+            'latency': self.recorder.summarize()
+        }
+
+
+def print_report(report):
+    print(f"\n{report['games_ended']} games ended in {report['duration_s']:.0f}s, "
+          f"{sum(report['discord_api_calls'].values())} Discord calls, {report['stats_api_requests']} stats API requests")
+    print(f"{'operation':<24} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for operation, stats in report['latency'].items():
+        print(f"{operation:<24} {stats['count']:>7} {stats['mean_ms']:>9.1f} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['max_ms']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run for.")
+    parser.add_argument('--members', type=int, default=300, help="Members in the guild.")
+    parser.add_argument('--history-games', type=int, default=2000, help="PUG games the stats API starts with (2v2 games are a quarter of this).")
+    parser.add_argument('--click-rate', type=float, default=2, help="Queue button clicks per second.")
+    parser.add_argument('--leave-fraction', type=float, default=0.2, help="Share of clicks by a member already in the queue, who leaves it.")
+    parser.add_argument('--chat-rate', type=float, default=5, help="Chat messages per second.")
+    parser.add_argument('--status-rate', type=float, default=0.5, help="Members going offline or coming back online per second.")
+    parser.add_argument('--afk-minutes', type=float, default=1, help="AFK time limit of the queue channel.")
+    parser.add_argument('--offline-minutes', type=float, default=0.5, help="Offline time limit of the queue channel.")
+    parser.add_argument('--check-interval', type=float, default=10, help="Seconds between the AFK and offline checks (a minute in the bot).")
+    parser.add_argument('--game-seconds', type=float, default=30, help="Average seconds before a game's captain ends it.")
+    parser.add_argument('--stats-interval', type=float, default=30, help="Seconds between stats API polls (5 minutes in the bot).")
+    parser.add_argument('--server-interval', type=float, default=10, help="Seconds between TA server status polls (30 seconds in the bot).")
+    parser.add_argument('--api-latency', type=float, default=0.05, help="Seconds each fake Discord call takes on average.")
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--output', help="Write the report to this JSON file.")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadGenerator(args).run())
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Offline parameter sweep for the rating and team balancing constants.
+
+Every combination of the given parameter values is scored on the cached NA games, in parallel worker processes:
+  * prediction: the ratings are replayed in order, and before each game win_probability is used to predict the
+    winner. The log-loss and accuracy of those predictions over the decisive games are reported.
+  * balancing: balance_teams is run on the rosters of the most recent games, with the ratings the replay ended
+    with. Its runtime and the win probability of the suggested teams are reported.
+
+Work is cached in benchmarks/.cache: the aggregated games (once per version of the game cache and of the rating
+code) and the results of each set of rating parameters, so repeating or extending a sweep only runs what is new.
+
+Usage (from the repository root):
+    python benchmarks/parameter_sweep.py --set tau=0.05,0.0833,0.15 --set capper_penalty=0,5,10 --workers 4
+"""
+import os
+import sys
+import json
+import time
+import pickle
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+from modules import rating_calculations, rating_replay, team_logic
+from modules.data_managment import load_game_cache
+from modules.rating_calculations import aggregate_player_data, compute_avg_picks, prepare_ratings
+from modules.rating_replay import replay_ratings
+
+CACHE_DIR = os.path.join(BASE_DIR, 'benchmarks', '.cache')
+GAME_CACHE = os.path.join(BASE_DIR, 'cache', 'NA_cache.json')
+
+# Bump when what is cached changes shape
+CACHE_FORMAT = 1
+
+# Modules whose code changes the aggregated games and the replays, so their source is part of the cache key
+SOURCE_FILES = [rating_calculations.__file__, rating_replay.__file__]
+
+# Parameter name -> (module, constant). Rating parameters change the replay, balance parameters only the balancer.
+RATING_PARAMETERS = {
+    'tau': (rating_calculations, 'RATING_TAU'),
+    'early_pick_bonus_scale': (rating_calculations, 'EARLY_PICK_BONUS_SCALE'),
+    'late_pick_bonus_scale': (rating_calculations, 'LATE_PICK_BONUS_SCALE'),
+}
+BALANCE_PARAMETERS = {
+    'capper_penalty': (team_logic, 'CAPPER_PENALTY'),
+    'new_player_penalty': (team_logic, 'NEW_PLAYER_PENALTY'),
+    'deviation_exponent': (team_logic, 'DEVIATION_EXPONENT'),
+}
+
+# Recent games whose rosters are balanced, and the smallest roster used
+BALANCE_SAMPLE_SIZE = 40
+MIN_ROSTER_SIZE = 8
+
+# Keeps log(0) out of the log-loss
+PROBABILITY_EPSILON = 1e-12
+
+# Loaded once per worker process by load_prepared
+prepared = None
+
+
+def write_pickle(filepath, value):
+    temp_file = f"{filepath}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_file, filepath)
+
+
+def read_pickle(filepath):
+    try:
+        with open(filepath, 'rb') as f:
+            return pickle.load(f)
+    except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def get_source_digest():
+    digest = hashlib.sha1()
+    for source_file in SOURCE_FILES:
+        with open(source_file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def get_data_key(game_cache):
+    stat = os.stat(game_cache)
+    return hashlib.sha1(repr((CACHE_FORMAT, os.path.abspath(game_cache), stat.st_mtime_ns, stat.st_size,
+                              get_source_digest())).encode()).hexdigest()[:16]
+
+
+def get_sample_rosters(game_data, sample_size):
+    """Rosters of the most recent drafted games with even teams of at least MIN_ROSTER_SIZE players, as (player ids, captains)."""
+    rosters = []
+    for game in reversed(game_data):
+        team1 = [player for player in game['players'] if player['team'] == 1]
+        team2 = [player for player in game['players'] if player['team'] == 2]
+        if len(team1) != len(team2) or len(team1) + len(team2) < MIN_ROSTER_SIZE:
+            continue
+        if any(player['pickOrder'] is None for player in game['players']):
+            continue
+        # Captains are the players who weren't picked
+        captains = [min(team, key=lambda player: player['pickOrder'])['user']['id'] for team in (team1, team2)]
+        rosters.append(([player['user']['id'] for player in team1 + team2], captains))
+        if len(rosters) == sample_size:
+            break
+    return rosters
+
+
+def prepare(game_cache, sample_size):
+    """Aggregate the games once per version of the game cache and save them for the workers. Returns the file."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    filepath = os.path.join(CACHE_DIR, f"prepared-{get_data_key(game_cache)}-{sample_size}.pickle")
+    if not os.path.exists(filepath):
+        game_data = load_game_cache(game_cache)
+        player_data = aggregate_player_data(game_data)
+        matches = player_data['matches']
+        winning_teams = np.array([game_data[index]['winningTeam'] for index in matches.match_indexes.tolist()])
+        write_pickle(filepath, {
+            'key': get_data_key(game_cache),
+            'game_data': game_data,
+            'player_data': player_data,
+            'avg_picks': compute_avg_picks(player_data['picks']),
+            'decisive': np.isin(winning_teams, (1, 2)),  # Draws are replayed as team 1 wins, but not scored
+            'rosters': get_sample_rosters(game_data, sample_size)
+        })
+    return filepath
+
+
+def load_prepared(filepath):
+    global prepared
+    prepared = read_pickle(filepath)
+
+
+def apply_parameters(parameters):
+    for name, value in parameters.items():
+        module, constant = {**RATING_PARAMETERS, **BALANCE_PARAMETERS}[name]
+        setattr(module, constant, value)
+
+
+def evaluate_ratings(rating_parameters):
+    """Replay the games with one set of rating parameters. Cached on disk by the parameters and the data."""
+    key = hashlib.sha1(json.dumps([prepared['key'], rating_parameters], sort_keys=True).encode()).hexdigest()[:16]
+    filepath = os.path.join(CACHE_DIR, f"ratings-{key}.pickle")
+    result = read_pickle(filepath)
+    if result is not None:
+        return result
+
+    apply_parameters(rating_parameters)
+    start = time.perf_counter()
+    env, player_data, starting_ratings = prepare_ratings(prepared['game_data'], 'NA', prepared['player_data'])
+    player_ids = player_data['ids']
+    mu = [starting_ratings[player_id].mu for player_id in player_ids]
+    sigma = [starting_ratings[player_id].sigma for player_id in player_ids]
+    predictions = np.full(len(player_data['matches']), np.nan)
+    replay_ratings(player_data['matches'], mu, sigma, env, record_history=False, predictions=predictions)
+    replay_seconds = time.perf_counter() - start
+
+    # Predictions are for the recorded winners, so every decisive game is an observed win
+    scored = predictions[prepared['decisive'] & ~np.isnan(predictions)]
+    probabilities = np.clip(scored, PROBABILITY_EPSILON, 1 - PROBABILITY_EPSILON)
+    result = {
+        'log_loss': float(-np.log(probabilities).mean()) if len(scored) else float('nan'),
+        'accuracy': float((scored > 0.5).mean()) if len(scored) else float('nan'),
+        'games_scored': int(len(scored)),
+        'replay_seconds': replay_seconds,
+        'ratings': {player_id: (mu[index], sigma[index]) for index, player_id in enumerate(player_ids)}
+    }
+    write_pickle(filepath, result)
+    return result
+
+
+def evaluate(parameters):
+    """Score one full set of parameters: the (cached) replay, then the balancer on the sample rosters."""
+    rating_parameters = {name: value for name, value in parameters.items() if name in RATING_PARAMETERS}
+    rating_result = evaluate_ratings(rating_parameters)
+    apply_parameters(parameters)
+
+    ratings = {player_id: rating_calculations.trueskill.Rating(mu=mu, sigma=sigma)
+               for player_id, (mu, sigma) in rating_result['ratings'].items()}
+    player_games = prepared['player_data']['games']
+    balance_seconds = []
+    balance_gaps = []
+    for player_ids, captains in prepared['rosters']:
+        players = [{'id': player_id, 'name': str(player_id), 'mu': ratings.get(player_id, team_logic.DEFAULT_RATING).mu}
+                   for player_id in player_ids]
+        start = time.perf_counter()
+        teams = team_logic.balance_teams(players, captains, player_games, prepared['avg_picks'], ratings)
+        balance_seconds.append(time.perf_counter() - start)
+        if teams:
+            team1 = [ratings.get(player['id'], team_logic.DEFAULT_RATING) for player in teams[0]['team1']]
+            team2 = [ratings.get(player['id'], team_logic.DEFAULT_RATING) for player in teams[0]['team2']]
+            balance_gaps.append(abs(rating_calculations.win_probability(team1, team2) - 0.5))
+
+    return {
+        'parameters': parameters,
+        'log_loss': rating_result['log_loss'],
+        'accuracy': rating_result['accuracy'],
+        'games_scored': rating_result['games_scored'],
+        'replay_seconds': rating_result['replay_seconds'],
+        'balance_mean_ms': 1000 * float(np.mean(balance_seconds)) if balance_seconds else float('nan'),
+        'balance_max_ms': 1000 * float(np.max(balance_seconds)) if balance_seconds else float('nan'),
+        'balance_win_probability_gap': float(np.mean(balance_gaps)) if balance_gaps else float('nan'),
+        'rosters': len(balance_seconds)
+    }
+
+
+def parse_value(text):
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"Not a number: {text}")
+
+
+def parse_grid(settings):
+    grid = {}
+    for setting in settings:
+        name, _, values = setting.partition('=')
+        if name not in RATING_PARAMETERS and name not in BALANCE_PARAMETERS:
+            raise SystemExit(f"Unknown parameter {name}. Choose from: {', '.join([*RATING_PARAMETERS, *BALANCE_PARAMETERS])}")
+        grid[name] = [parse_value(value) for value in values.split(',') if value]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=V1,V2,...',
+                        help="Values to try for a parameter (repeat for more parameters). Others keep their current value.")
+    parser.add_argument('--games', default=GAME_CACHE, help="Game cache to replay (default: cache/NA_cache.json).")
+    parser.add_argument('--rosters', type=int, default=BALANCE_SAMPLE_SIZE, help="Recent rosters to balance per parameter set.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes.")
+    parser.add_argument('--output', help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    grid = parse_grid(args.set)
+    names = list(grid)
+    parameter_sets = [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+    start = time.perf_counter()
+    prepared_file = prepare(args.games, args.rosters)
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=load_prepared, initargs=(prepared_file,)) as executor:
+        # Replay each distinct set of rating parameters once, then score every combination against the cached replays
+        rating_sets = {json.dumps({name: value for name, value in parameters.items() if name in RATING_PARAMETERS}, sort_keys=True)
+                       for parameters in parameter_sets}
+        list(executor.map(evaluate_ratings, [json.loads(rating_set) for rating_set in rating_sets]))
+        results = list(executor.map(evaluate, parameter_sets))
+
+    results.sort(key=lambda result: result['log_loss'])
+    print(f"{len(results)} parameter sets in {time.perf_counter() - start:.1f}s, best log-loss first:")
+    print(f"{'log-loss':>9} {'accuracy':>9} {'balance ms':>11} {'p gap':>7}  parameters")
+    for result in results:
+        described = ", ".join(f"{name}={value}" for name, value in result['parameters'].items()) or "(current values)"
+        print(f"{result['log_loss']:>9.4f} {result['accuracy']:>9.3f} {result['balance_mean_ms']:>11.2f} "
+              f"{result['balance_win_probability_gap']:>7.3f}  {described}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""
+Microbenchmarks for the bot's hot paths, on synthetic data and the recorded game caches.
+
+Each benchmark is run a few times and its median and fastest time are kept. Results are written as JSON and
+compared with the stored baseline (benchmarks/baseline.json): a benchmark whose fastest run is more than --threshold
+slower than its baseline's (and at least MIN_REGRESSION_MS slower) is reported as a regression, and the script exits with status 1.
+
+Baselines are only comparable on the machine they were recorded on, so record one before changing anything:
+    python benchmarks/run_benchmarks.py --update-baseline
+    ... make changes ...
+    python benchmarks/run_benchmarks.py
+
+Run from the directory holding the bot's config.ini (normally the repository root), since the bot's modules read it on import.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, BASE_DIR)
+
+import matplotlib
+matplotlib.use('Agg')
+import trueskill
+
+from data.player_mappings import player_name_mapping
+from modules import member_index
+from modules.charts import create_map_weights_chart, create_rolling_percentage_chart, plot_game_lengths
+from modules.data_managment import fetch_data, save_to_bson
+from modules.member_index import MemberNameIndex
+from modules.rating_calculations import calculate_ratings, compute_avg_picks
+from modules.utilities import get_balanced_teams_list, match_ids
+from cogs import pug_queue
+from benchmarks.synthetic import SEED, generate_games, generate_members
+
+BASELINE_FILE = os.path.join(BASE_DIR, 'benchmarks', 'baseline.json')
+RESULTS_FILE = os.path.join(BASE_DIR, 'benchmarks', 'results.json')
+
+# Slowdown of the fastest run, the timing least affected by other load, reported as a regression
+REGRESSION_THRESHOLD = 0.25
+# Slowdowns smaller than this are timer noise, however large relative to a sub-millisecond baseline
+MIN_REGRESSION_MS = 0.5
+
+ROSTER_SIZES = (8, 10, 12, 14, 16, 18, 20)
+GAME_COUNTS = (1000, 10000, 50000)
+GUILD_SIZES = (100, 1000, 10000)
+
+benchmarks = []
+
+
+def benchmark(name, repeat=5):
+    """Register a benchmark. The function returns the callable to time, so setup is kept out of the timings."""
+    def register(setup):
+        benchmarks.append((name, setup, repeat))
+        return setup
+    return register
+
+
+def time_calls(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+class FakeMember:
+    def __init__(self, member_id, name, display_name):
+        self.id = member_id
+        self.name = name
+        self.display_name = display_name
+
+
+class FakeGuild:
+    def __init__(self, guild_id, members):
+        self.id = guild_id
+        self.members = members
+        self.members_by_id = {member.id: member for member in members}
+
+    def get_member(self, member_id):
+        return self.members_by_id.get(member_id)
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+
+
+class FakeBot:
+    def __init__(self, guild):
+        self.guild = guild
+
+    def get_guild(self, guild_id):
+        return self.guild
+
+
+class FakeEmbed:
+    def __init__(self, description):
+        self.description = description
+
+
+def generate_guild(guild_id, size, seed=SEED):
+    """A guild with the mapped players and enough other members to reach size."""
+    return FakeGuild(guild_id, [FakeMember(*member) for member in generate_members(size, seed)])
+
+
+def generate_roster(size, seed=SEED):
+    """Players, captains and the rating inputs of the balancer, for a roster of size synthetic players."""
+    rng = random.Random(seed + size)
+    player_ratings = {}
+    player_games = {}
+    picks = {}
+    players = []
+    for i in range(size):
+        player_id = 100000 + i
+        player_ratings[player_id] = trueskill.Rating(mu=rng.uniform(5, 35), sigma=rng.uniform(1, 4))
+        player_games[player_id] = rng.randint(0, 1000)
+        picks[player_id] = [rng.randint(1, 12) for _ in range(10)]
+        players.append({'id': player_id, 'name': f"player{i}", 'mu': player_ratings[player_id].mu})
+    captains = [players[0]['id'], players[1]['id']]
+    return players, captains, {'games': player_games}, compute_avg_picks(picks), player_ratings
+
+
+for roster_size in ROSTER_SIZES:
+    @benchmark(f"balance_teams/{roster_size} players")
+    def setup_balance(size=roster_size):
+        # The bot's entry point: every split up to MAX_EXHAUSTIVE_PLAYERS, a local search for larger rosters
+        players, captains, player_data, avg_picks, player_ratings = generate_roster(size)
+        return lambda: get_balanced_teams_list(players, captains, player_data, avg_picks, player_ratings)
+
+for game_count in GAME_COUNTS:
+    @benchmark(f"calculate_ratings/{game_count} games", repeat=3 if game_count < 50000 else 1)
+    def setup_ratings(count=game_count):
+        games = generate_games(count)
+        return lambda: calculate_ratings(games, queue='NA')
+
+for guild_size in GUILD_SIZES:
+    @benchmark(f"match_ids/{guild_size} members", repeat=20)
+    def setup_match_ids(size=guild_size):
+        guild = generate_guild(size, size)
+        # Built here rather than on first use, which would also load (and possibly create) the player registry
+        member_index.member_indexes[guild.id] = MemberNameIndex(guild.members, player_name_mapping)
+        channel = FakeChannel(1, guild)
+        roster = random.Random(SEED).sample(guild.members, 12)
+        names = [member.display_name for member in roster[2:10]] + ["unknownplayer", roster[10].name.upper(), f"x{roster[11].name}"]
+        embed = FakeEmbed(f"Captains: <@{roster[0].id}> & <@{roster[1].id}>\n" + ", ".join(names))
+        loop = asyncio.new_event_loop()
+        return lambda: loop.run_until_complete(match_ids(channel, embed))
+
+    @benchmark(f"member_index/{guild_size} members")
+    def setup_member_index(size=guild_size):
+        guild = generate_guild(size, size)
+        return lambda: MemberNameIndex(guild.members, player_name_mapping)
+
+
+@benchmark("generate_queue_embed", repeat=20)
+def setup_queue_embed():
+    guild = generate_guild(1, 1000)
+    mapped = [member for member in guild.members if member.id in player_name_mapping]
+    queues = {'PUGz': {'size': 14, 'members': [[str(member.id), time.time()] for member in mapped[:10]]},
+              '2v2': {'size': 4, 'members': [[str(member.id), time.time()] for member in mapped[10:12]]}}
+    ongoing_games = {f"1-2-{i}": {'queue_name': 'PUGz', 'timestamp': time.time() - 600, 'captains': [mapped[0].id, mapped[1].id],
+                                  'members': [{'id': member.id, 'name': member.display_name} for member in mapped[:14]]}
+                     for i in range(3)}
+
+    # The embed reads the queue state from the queue cog's cache files, so point it at synthetic ones
+    cache_dir = tempfile.mkdtemp()
+    save_to_bson({str(guild.id): {'2': queues}}, os.path.join(cache_dir, 'queues.bson'))
+    save_to_bson(ongoing_games, os.path.join(cache_dir, 'ongoing_games.bson'))
+    bot = FakeBot(guild)
+
+    def run():
+        pug_cache_dir, pug_queue.CACHE_DIR = pug_queue.CACHE_DIR, cache_dir
+        try:
+            pug_queue.generate_queue_embed(guild.id, 2, bot)
+        finally:
+            pug_queue.CACHE_DIR = pug_cache_dir
+    return run
+
+
+for queue in ('NA', '2v2', 'ALL'):
+    @benchmark(f"fetch_data/{queue} cache", repeat=3)
+    def setup_fetch_data(queue=queue):
+        # Recorded games, so the timings follow the real caches' size
+        return lambda: fetch_data(datetime(2018, 1, 1), datetime.now(), queue)
+
+
+@benchmark("charts/map weights", repeat=3)
+def setup_map_weights_chart():
+    rng = random.Random(SEED)
+    map_weights = {f"Map {i}": rng.uniform(0, 1) for i in range(20)}
+    arena_map_weights = {f"Arena {i}": rng.uniform(0, 1) for i in range(8)}
+    return lambda: create_map_weights_chart(map_weights, arena_map_weights)
+
+
+@benchmark("charts/rolling percentage", repeat=3)
+def setup_rolling_percentage_chart():
+    games = generate_games(2000)
+    return lambda: create_rolling_percentage_chart(100000, games, 'NA')
+
+
+@benchmark("charts/game lengths", repeat=3)
+def setup_game_lengths_chart():
+    rng = random.Random(SEED)
+    game_lengths = [rng.uniform(15, 40) for _ in range(5000)]
+    return lambda: plot_game_lengths(game_lengths, 'NA')
+
+
+def run_benchmarks(selected=None, repeat=None):
+    results = {}
+    chart_dir = tempfile.mkdtemp()
+    os.makedirs(os.path.join(chart_dir, 'charts'))
+    for name, setup, default_repeat in benchmarks:
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        func = setup()
+        # Charts are written to charts/ under the working directory, so keep them out of the repository
+        cwd = os.getcwd()
+        os.chdir(chart_dir)
+        try:
+            func()  # Warm up caches and imports, as the bot would be
+            timings = time_calls(func, repeat or default_repeat)
+        finally:
+            os.chdir(cwd)
+        results[name] = {'median_ms': 1000 * statistics.median(timings), 'min_ms': 1000 * min(timings), 'runs': len(timings)}
+        print(f"{name:<40} {results[name]['median_ms']:>10.2f} ms (min {results[name]['min_ms']:.2f} ms, {len(timings)} runs)")
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Print each benchmark's change from the baseline. Returns the names of the regressed benchmarks."""
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print(f"{name:<40} {'-':>10} {result['min_ms']:>10.2f} {'new':>8}")
+            continue
+        change = result['min_ms'] / previous['min_ms'] - 1
+        regressed = change > threshold and result['min_ms'] - previous['min_ms'] > MIN_REGRESSION_MS
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<40} {previous['min_ms']:>10.2f} {result['min_ms']:>10.2f} {change:>+8.0%}{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--only', action='append', help="Only run benchmarks whose name contains this (repeatable).")
+    parser.add_argument('--repeat', type=int, help="Runs per benchmark, instead of each benchmark's default.")
+    parser.add_argument('--output', default=RESULTS_FILE, help="Where to write the results (default: benchmarks/results.json).")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Baseline to compare with (default: benchmarks/baseline.json).")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="Slowdown of the fastest run counted as a regression, as a fraction (default: 0.25).")
+    parser.add_argument('--update-baseline', action='store_true', help="Store these results as the baseline instead of comparing.")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.only, args.repeat)
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(), 'processor': platform.processor()},
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        # Keep the baseline of benchmarks that weren't run this time
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)['results']
+        report['results'] = {**baseline, **results}
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved the baseline to {args.baseline}.")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}. Record one with --update-baseline.")
+        return
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    if baseline['machine'] != report['machine']:
+        print(f"\nThe baseline was recorded on a different machine ({baseline['machine']['platform']}), so timings may not be comparable.")
+    regressions = compare(results, baseline['results'], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) regressed by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Synthetic players and games for the benchmarks and the load generator, generated from a seed so runs are comparable.
+"""
+import random
+from datetime import datetime
+
+from data.player_mappings import player_name_mapping
+
+PLAYER_POOL_SIZE = 400
+SEED = 1
+
+
+def generate_members(size, seed=SEED):
+    """(id, username, display name) of the mapped players, then enough other members to reach size."""
+    rng = random.Random(seed)
+    members = [(player_id, name.lower(), name) for player_id, name in list(player_name_mapping.items())[:size]]
+    while len(members) < size:
+        i = len(members)
+        name = f"member{i}"
+        members.append((200000 + i, name, rng.choice((name, f"Display{i}", f"[TAG] Member {i}"))))
+    return members
+
+
+def generate_games(count, users=None, team_size=7, queue_name='PUGz', start=datetime(2020, 1, 1), seed=SEED):
+    """
+    Games shaped like the stats API's, drafted from a pool of players with hidden skills.
+    :param users: [{'id', 'name'}] to draw the players from, PLAYER_POOL_SIZE synthetic players by default.
+    """
+    rng = random.Random(seed)
+    if users is None:
+        users = [{'id': 100000 + i, 'name': f"player{i}"} for i in range(PLAYER_POOL_SIZE)]
+    skills = [rng.gauss(0, 1) for _ in range(len(users))]
+    queue = {'id': 1, 'name': queue_name}
+    timestamp = int(start.timestamp() * 1000)
+
+    games = []
+    for _ in range(count):
+        roster = rng.sample(range(len(users)), 2 * team_size)
+        captains, picks = roster[:2], sorted(roster[2:], key=lambda i: -skills[i] + rng.gauss(0, 0.5))
+        players = [{'user': users[captain], 'team': team, 'captain': 1, 'pickOrder': 0}
+                   for team, captain in zip((1, 2), captains)]
+        strength = {1: skills[captains[0]], 2: skills[captains[1]]}
+        for pick_order, i in enumerate(picks, start=1):
+            team = 1 if pick_order % 4 in (0, 1) else 2
+            players.append({'user': users[i], 'team': team, 'captain': 0, 'pickOrder': pick_order})
+            strength[team] += skills[i]
+
+        winning_team = 1 if strength[1] - strength[2] + rng.gauss(0, 2) > 0 else 2
+        duration = rng.randint(15, 40) * 60 * 1000
+        games.append({'timestamp': timestamp, 'completionTimestamp': timestamp + duration, 'winningTeam': winning_team,
+                      'queue': queue, 'players': players})
+        timestamp += duration + rng.randint(1, 120) * 60 * 1000
+    return games
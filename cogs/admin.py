@@ -5,6 +5,7 @@ from discord import Member
 from discord.ext import commands
 from datetime import datetime, timedelta
 from modules.utilities import check_bot_admin
+from modules.player_registry import set_player_name, set_capper_value
 from data.capper_data import capper_value_mapping
 from data.player_mappings import player_name_mapping
 
@@ -69,31 +70,12 @@ class AdminCog(commands.Cog):
             await ctx.send(embed=embed)
             return
 
-        # Open the capper_data.py file to read its current contents
-        with open("data/capper_data.py", "r") as file:
-            lines = file.readlines()
-
-        # Modify or add the new value for the user
-        user_line_index = None
         # Fetch the player's name from the player_name_mapping or use the discord name as a fallback
         player_name = player_name_mapping.get(user.id, user.display_name)
-        user_line_content = f"    {user.id}: {value},  # {player_name}\n"
-        for i, line in enumerate(lines):
-            if str(user.id) in line:
-                user_line_index = i
-                break
-
-        action = "set"
-        if user_line_index is not None:
-            lines[user_line_index] = user_line_content
-            action = "updated"
-        else:
-            # Assuming that the dictionary ends with a closing brace on the last line
-            lines.insert(-1, user_line_content)
+        action = "updated" if user.id in capper_value_mapping else "set"
 
-        # Write the modified content back to capper_data.py
-        with open("data/capper_data.py", "w") as file:
-            file.writelines(lines)
+        # The registry updates capper_value_mapping in place, so team balancing uses the new value right away
+        set_capper_value(user.id, value)
 
         # Notify the user of the successful update
         embed = discord.Embed(color=discord.Color.green(), description=f"Capper value for **{player_name}** has been {action} to **{value}**.")
@@ -108,15 +90,8 @@ class AdminCog(commands.Cog):
 
 
         try:
-            # Update the in-memory mapping
-            player_name_mapping[member.id] = new_name
-            
-            # Write the changes to the file
-            with open('data/player_mappings.py', 'w', encoding='utf-8') as file:
-                file.write("player_name_mapping = {\n")
-                for id, name in player_name_mapping.items():
-                    file.write(f"    {id}: \"{name}\",\n")
-                file.write("}\n")
+            # Saves the name and updates player_name_mapping and the name lookups in place
+            set_player_name(member.id, new_name)
 
             # Send a confirmation using an embed
             embed = discord.Embed(title="Name Updated", color=0x00ff00) # Green color for success
@@ -1,9 +1,10 @@
 import aiohttp
-from filelock import FileLock
 from discord.ext import commands, tasks
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
-import json
+
+from modules.data_managment import GAMES_URL
+from modules.rating_engine import ingest_games
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 CACHE_DIR = os.path.join(BASE_DIR, 'cache')
@@ -23,50 +24,14 @@ class QueueCacheCog(commands.Cog):
     @tasks.loop(seconds=300)
     async def update_queues_cache(self):
         try:
-            for queue in ['2v2', 'NA', 'ALL']:
-                data = await fetch_data(datetime(year=2018, month=1, day=1), datetime.now(), queue)
-                self.save_queue_to_cache(queue, data)
+            # Every queue is cut from the same payload, so it is only fetched once
+            game_data = await fetch_games()
+            ingest_games(game_data, datetime(year=2018, month=1, day=1), datetime.now())
         except Exception as e:
             print(f"An error occurred while updating the queues cache: {e}")
 
-    def save_queue_to_cache(self, queue, data):
-        queue_cache_file_path = os.path.join(CACHE_DIR, f"{queue}_cache.json")
-        with FileLock(queue_cache_file_path + ".lock"):
-            with open(queue_cache_file_path, 'w') as f:
-                json.dump(data, f)
-
-
-async def fetch_data(start_date, end_date, queue):
-    base_url = 'http://50.116.36.119/api/server/'
-
-    queue_mapping = {
-        '2v2': {
-            'urls': [base_url + '631438713183797258/games'],
-            'queue_filters': ['2v2']
-        },
-        'NA': {
-            'urls': [base_url + '631438713183797258/games'],
-            'queue_filters': ['PUGz']
-        },
-        'ALL': {
-            'urls': [base_url + '631438713183797258/games', base_url + '631438713183797258/games'],
-            'queue_filters': ['2v2', 'PUGz']
-        }
-    }
 
-    if queue not in queue_mapping:
-        raise ValueError(f"Invalid queue: {queue}")
-
-    combined_data = []
-    
+async def fetch_games():
     async with aiohttp.ClientSession() as session:
-        for url, queue_filter in zip(queue_mapping[queue]['urls'], queue_mapping[queue]['queue_filters']):
-            async with session.get(url) as response:
-                game_data = await response.json()
-
-                filtered_data = [game for game in game_data
-                                 if game['queue']['name'] == queue_filter
-                                 and start_date <= datetime.fromtimestamp(game['timestamp'] / 1000) <= end_date]
-                combined_data.extend(filtered_data)
-
-    return combined_data
\ No newline at end of file
+        async with session.get(GAMES_URL) as response:
+            return await response.json()
@@ -15,9 +15,13 @@ from discord.ext import commands, tasks
 
 # Custom modules
 from data.player_mappings import player_name_mapping
-from modules.data_managment import fetch_data, save_to_bson, load_from_bson
+from modules.data_managment import save_to_bson, load_from_bson
 from modules.utilities import (send_balanced_teams, check_bot_admin)
-from modules.rating_calculations import calculate_ratings
+from modules.rating_engine import get_queue_ratings
+from modules.notifications import dispatch_dms
+from modules.map_catalog import get_map_weights, get_arena_map_weights, invalidate_map_catalog
+from modules.member_index import get_member_index
+from modules.player_search import EXACT, search_players, find_player
 
 # ---- CONSTANTS ---- #
 
@@ -363,8 +367,8 @@ class PugQueueCog(commands.Cog):
         # If no action is provided, show the help embed
         if not action:
             # Loading the current map weights
-            map_weights = load_from_bson(os.path.join(DATA_DIR, 'map_weights.bson'))
-            arena_map_weights = load_from_bson(os.path.join(DATA_DIR, 'arena_map_weights.bson'))
+            map_weights = get_map_weights()
+            arena_map_weights = get_arena_map_weights()
 
             # Sorting the map weights in descending order
             sorted_map_weights = dict(sorted(map_weights.items(), key=lambda item: item[1], reverse=True))
@@ -437,6 +441,7 @@ class PugQueueCog(commands.Cog):
                 map_data[map_name] = float(weight)
 
             save_to_bson(map_data, filepath)
+            invalidate_map_catalog()
             
             embed = discord.Embed(
                 title="Success",
@@ -672,9 +677,9 @@ class PugQueueCog(commands.Cog):
         else:
             content += "Error: Couldn't fetch the pug channel details.\n"
 
-        # Load the map weights and arena map weights from BSON
-        map_weights = load_from_bson(os.path.join(DATA_DIR, 'map_weights.bson'))
-        arena_map_weights = load_from_bson(os.path.join(DATA_DIR, 'arena_map_weights.bson'))
+        # Load the map weights and arena map weights from the map catalog
+        map_weights = get_map_weights()
+        arena_map_weights = get_arena_map_weights()
 
         # Add the maps with their weights to the content
         content += "\n**Maps and Weights:**\n"
@@ -842,9 +847,9 @@ class PugQueueCog(commands.Cog):
         await ctx.send(embed=embed)
 
         # Fetch player ratings and assign a default rating if not available
-        data = fetch_data(datetime(2018, 1, 1), datetime.now(), 'NA')
+        queue_ratings = get_queue_ratings('NA')
         default_rating = trueskill.Rating(mu=15, sigma=5)
-        player_ratings, _, _, _ = calculate_ratings(data, queue='NA')
+        data, player_ratings = queue_ratings.game_data, queue_ratings.ratings
         game = ongoing_games[ongoing_game_id]
 
         # Build a list similar to the `players` list in start_game
@@ -856,7 +861,7 @@ class PugQueueCog(commands.Cog):
             } for player in game["members"]
         ]
 
-        await send_balanced_teams(ctx.bot, ctx.bot.get_channel(game["channel_id"]), players, player_ratings, game["captains"], data)
+        await send_balanced_teams(ctx.bot, ctx.bot.get_channel(game["channel_id"]), players, player_ratings, game["captains"], data, queue_ratings.data_version)
         
     @commands.command()
     async def gamestats(self, ctx):
@@ -1135,38 +1140,39 @@ async def get_user_id_from_input(ctx, user_input):
     if user_input.startswith('<@') and user_input.endswith('>'):
         return int(user_input.strip('<@!>'))
 
-    # 2. Use the player_name_mapping
-    # Check if the exact name exists in the mapping
-    reverse_mapping = {v: k for k, v in player_name_mapping.items()}
-    if user_input in reverse_mapping:
-        return reverse_mapping[user_input]
+    # 2. Check if the exact name exists in the player_name_mapping
+    results = search_players(user_input, limit=1, fuzzy=False)
+    if results and results[0].kind == EXACT:
+        return results[0].id
     
     # 3. Check the server members by name/nickname
-    member = discord.utils.find(lambda m: m.name == user_input or m.display_name == user_input, ctx.guild.members)
-    if member:
-        return member.id
+    member_index = get_member_index(ctx.guild)
+    member_id = member_index.get_id(user_input)
+    if member_id:
+        return member_id
     
-    # 4. Do a partial match search
-    # Check if a partial name exists in the mapping
-    possible_matches = [(k, v) for k, v in player_name_mapping.items() if user_input.lower() in v.lower()]
-    
-    # If only one possible match is found
-    if len(possible_matches) == 1:
-        return possible_matches[0][0]
-    
-    # If multiple matches, prioritize the one that has the closest length to the input string
-    elif possible_matches:
-        closest_match = min(possible_matches, key=lambda item: abs(len(item[1]) - len(user_input)))
-        
-        # Check if there are other matches with the same length
-        same_length_matches = [match for match in possible_matches if len(match[1]) == len(closest_match[1])]
-        
-        if len(same_length_matches) == 1:
-            return closest_match[0]
-        else:
-            names = ', '.join(match[1] for match in same_length_matches)
-            await ctx.send(f"Multiple players found with similar names ({names}). Please be more specific.")
-            return None
+    # 4. Search the mapping for case-insensitive and partial names
+    player_id, candidates = find_player(user_input, fuzzy=False)
+    if player_id:
+        return player_id
+    if candidates:
+        names = ', '.join(candidates)
+        await ctx.send(f"Multiple players found with similar names ({names}). Please be more specific.")
+        return None
+
+    # 5. Fall back to a unique case-insensitive or prefix match on the server members
+    member_ids = member_index.get_ids_casefold(user_input) or member_index.get_ids_by_prefix(user_input, limit=2)
+    if len(member_ids) == 1:
+        return member_ids[0]
+
+    # 6. Allow for typos in the mapped names
+    player_id, candidates = find_player(user_input)
+    if player_id:
+        return player_id
+    if candidates:
+        names = ', '.join(candidates)
+        await ctx.send(f"Multiple players found with similar names ({names}). Please be more specific.")
+        return None
 
     # If no match is found
     await ctx.send(f"Cannot find a player with the name {user_input}.")
@@ -1175,10 +1181,10 @@ async def get_user_id_from_input(ctx, user_input):
 
 
 async def start_game(bot, guild_id, channel_id, queue_name, members):
-    data = fetch_data(datetime(2018, 1, 1), datetime.now(), 'NA')
+    queue_ratings = get_queue_ratings('NA')
     # Fetch player ratings and assign a default rating if not available
     default_rating = trueskill.Rating(mu=15, sigma=5)
-    player_ratings, _, _, _ = calculate_ratings(data, queue='NA')
+    data, player_ratings = queue_ratings.game_data, queue_ratings.ratings
     
     players = [
         {
@@ -1202,9 +1208,8 @@ async def start_game(bot, guild_id, channel_id, queue_name, members):
     )
     await channel.send(embed=game_started_embed)
 
-    # Send the embed to all players in the game
-    for player in players:
-        await send_game_start_dm(bot, player, queue_name, captains, players)
+    # DM all players in the background so the balanced teams aren't held up by the DM round-trips
+    asyncio.create_task(send_game_start_dms(bot, channel, queue_name, captains, players))
 
     # Store the game to ongoing_games.bson
     game_id = f"{guild_id}-{channel_id}-{queue_name}-{int(time.time())}"
@@ -1236,7 +1241,7 @@ async def start_game(bot, guild_id, channel_id, queue_name, members):
     for member in [m["id"] for m in ongoing_game["members"]]:
         remove_player_from_all_queues(member)
 
-    await send_balanced_teams(bot, channel, players, player_ratings, captains, data)
+    await send_balanced_teams(bot, channel, players, player_ratings, captains, data, queue_ratings.data_version)
 
 
         
@@ -1509,12 +1514,7 @@ def is_user_banned(guild_id, channel_id, user_id):
     return guild_id_str in bans and channel_id_str in bans[guild_id_str] and user_id in bans[guild_id_str][channel_id_str]
 
 
-async def send_game_start_dm(bot, player, queue_name, captains, players):
-    user = bot.get_user(player["id"])
-    if not user:
-        print(f"Failed to find user for {player['name']}.")
-        return
-    
+def build_game_start_dm(bot, player, queue_name, captains, players):
     # Generate a random message for the embed
     embed_description = random_game_start_message(player["name"], queue_name)
     
@@ -1524,11 +1524,17 @@ async def send_game_start_dm(bot, player, queue_name, captains, players):
     # Exclude captains from players list for the DM
     non_captain_players = [p["name"] for p in players if p["id"] not in captains]
     embed.add_field(name="Players", value=", ".join(non_captain_players), inline=True)
+    return embed
+
+async def send_game_start_dms(bot, channel, queue_name, captains, players):
+    """Send the game start DM to every player, and report the players that couldn't be reached."""
+    messages = [(player["id"], player["name"], build_game_start_dm(bot, player, queue_name, captains, players)) for player in players]
+    failures = await dispatch_dms(bot, messages)
 
-    try:
-        await user.send(embed=embed)
-    except Exception as e:
-        print(f"Failed to send DM to {player['name']}. Error: {e}")
+    if failures:
+        names = ", ".join(f"`{name}`" for name, _ in failures.values())
+        embed = discord.Embed(description=f"Couldn't send the game start DM to: {names}", color=discord.Color.orange())
+        await channel.send(embed=embed)
 
 def random_game_start_message(player_name, queue_name):
     messages = [
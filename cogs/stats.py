@@ -9,16 +9,24 @@ from discord import Embed, Colour
 from datetime import datetime, timedelta
 from data.player_mappings import player_name_mapping
 from modules.data_managment import (fetch_data)
-from modules.utilities import parse_game_history_from_channel
-from modules.rating_calculations import calculate_ratings
+from modules.map_history import get_recent_maps
+from modules.player_search import find_player
+from modules.leaderboard import get_leaderboard_players
+from modules.player_image import render_players_image
+from modules.rating_timeline import get_rating_timeline
 from modules.charts import (create_rolling_percentage_chart, plot_game_lengths)
-
-from PIL import Image, ImageDraw, ImageFont
+from modules.game_lengths import (get_smoothed_game_lengths, get_game_lengths_by_month, get_game_lengths_by_map)
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 DATA_DIR = os.path.join(BASE_DIR, 'data')
 completed_games_file = os.path.join(DATA_DIR, "completed_games.json")
 
+# Rows shown by !gamelengths month/map
+GAME_LENGTH_BREAKDOWN_ROWS = 15
+
+# Months shown by !ratinghistory
+RATING_HISTORY_ROWS = 12
+
 class StatsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -150,60 +158,11 @@ class StatsCog(commands.Cog):
             return
 
         try:
-            # Get the timestamp for 6 months ago
-            six_months_ago = datetime.now() - timedelta(days=6*30)  # Using a rough estimate of 6 months
-            six_months_ago_timestamp = int(six_months_ago.timestamp() * 1000)  # Convert to the same format used in the data
+            players_list = get_leaderboard_players(min_games)
 
-            # Fetching the data and calculating ratings
-            end_date = datetime.now()
-            start_date = datetime(2018, 1, 1)
-            data = fetch_data(start_date, end_date, 'NA')
-
-            # Get the latest game timestamp for each player
-            latest_game_timestamps = {}
-            for game in data:
-                for player in game['players']:
-                    user_id = player['user']['id']
-                    game_timestamp = game['timestamp']
-                    if user_id not in latest_game_timestamps or game_timestamp > latest_game_timestamps[user_id]:
-                        latest_game_timestamps[user_id] = game_timestamp
-
-            # Filter players based on activity and minimum games played criteria
-            active_players = {user_id for user_id, timestamp in latest_game_timestamps.items() if timestamp >= six_months_ago_timestamp}
-            player_ratings, _, games_played, _ = calculate_ratings(data, queue='NA')
-            players_list = [{'id': user_id, 'mu': rating.mu, 'sigma': rating.sigma} for user_id, rating in player_ratings.items() 
-                            if user_id in active_players and games_played[user_id] >= min_games]
-
-            players_list.sort(key=lambda x: x['mu'], reverse=True)
-
-            # Constants for image creation
-            COLUMNS = 3
-            FONT_SIZE = 24  # Approximate font size for Discord
-            SPACING = 5  # Space between each line
-            MARGIN = 10  # Margin for the image
-            WIDTH_PER_COLUMN = 450  # Width allocation for each column
-            TOTAL_WIDTH = WIDTH_PER_COLUMN * COLUMNS + 2 * MARGIN
-            HEIGHT = (FONT_SIZE + SPACING) * len(players_list) // COLUMNS + 2 * MARGIN + 10
-            NAME_WIDTH = 150  # Set a fixed width for player names
-            VALUE_SPACING = 5  # Spacing between the name and the µ value
-
-            # Create a transparent image
-            img = Image.new("RGBA", (TOTAL_WIDTH, HEIGHT), (255, 255, 255, 0))
-            d = ImageDraw.Draw(img)
-            font = ImageFont.truetype("arial.ttf", FONT_SIZE)  # Using Arial font, you might need to adjust the path
-
-            # Calculate the number of players in each column
-            base_players_per_column = len(players_list) // COLUMNS
-            remainder_players = len(players_list) % COLUMNS
-            players_in_columns = [base_players_per_column + (1 if i < remainder_players else 0) for i in range(COLUMNS)]
-            
-            current_column = 0
-            players_in_current_column = 0
-
-            for j, player in enumerate(players_list):
+            rows = []
+            for player in players_list:
                 user_id = player['id']
-                mu = player['mu']
-                sigma = player['sigma']
 
                 # Getting the player name from the mapping or the guild members
                 name = player_name_mapping.get(user_id)
@@ -211,29 +170,9 @@ class StatsCog(commands.Cog):
                     member = ctx.guild.get_member(user_id)
                     name = member.display_name if member else str(user_id)
 
-                # Truncate the name if it's too long
-                while d.textsize(name, font=font)[0] > NAME_WIDTH:
-                    name = name[:-1]
-
-                # Determine which column the player should be in based on the distribution
-                x_name = MARGIN + current_column * WIDTH_PER_COLUMN
-                y = MARGIN + players_in_current_column * (FONT_SIZE + SPACING)
-                d.text((x_name, y), name, fill="white", font=font)
+                rows.append((name, f"{player['mu']:.2f}µ, {player['sigma']:.2f}σ"))
 
-                x_value = x_name + NAME_WIDTH + VALUE_SPACING
-                d.text((x_value, y), f"{mu:.2f}µ, {sigma:.2f}σ", fill="white", font=font)
-
-                # Update counters for column distribution
-                players_in_current_column += 1
-                if players_in_current_column >= players_in_columns[current_column]:
-                    current_column += 1
-                    players_in_current_column = 0
-
-            if not os.path.exists("charts"):
-                os.makedirs("charts")
-
-            path = "charts/players_chart.png"
-            img.save(path)
+            path = render_players_image(rows, "charts/players_chart.png")
 
             # Send the image
             await ctx.send(file=discord.File(path))
@@ -301,37 +240,7 @@ class StatsCog(commands.Cog):
             return
 
         try:
-            # Get the timestamp for 6 months ago
-            six_months_ago = datetime.now() - timedelta(days=6*30)  # Using a rough estimate of 6 months
-            six_months_ago_timestamp = int(six_months_ago.timestamp() * 1000)  # Convert to the same format used in the data
-
-            # Fetching the data and calculating ratings
-            end_date = datetime.now()
-            start_date = datetime(2018, 1, 1)
-            data = fetch_data(start_date, end_date, 'NA')
-
-            # Get the latest game timestamp for each player
-            latest_game_timestamps = {}
-            for game in data:
-                for player in game['players']:
-                    user_id = player['user']['id']
-                    game_timestamp = game['timestamp']
-                    if user_id not in latest_game_timestamps or game_timestamp > latest_game_timestamps[user_id]:
-                        latest_game_timestamps[user_id] = game_timestamp
-
-            # Filter players based on activity and minimum games played criteria
-            active_players = {user_id for user_id, timestamp in latest_game_timestamps.items() if timestamp >= six_months_ago_timestamp}
-            player_ratings, _, games_played, _ = calculate_ratings(data, queue='NA')
-            players_list = [{'id': user_id, 'mu': rating.mu} for user_id, rating in player_ratings.items() 
-                            if user_id in active_players and games_played[user_id] >= min_games]
-
-            players_list.sort(key=lambda x: x['mu'], reverse=True)
-            total_players = len(players_list)
-
-            # Correcting the percentile calculation
-            for index, player in enumerate(players_list):
-                player["percentile"] = 1 - (index / total_players)
-                player["rank"] = determine_rank(player["percentile"])
+            players_list = get_leaderboard_players(min_games)
 
             # Group players by rank
             players_grouped_by_rank = {}
@@ -391,31 +300,7 @@ class StatsCog(commands.Cog):
             return
 
         try:
-            # Get the timestamp for 6 months ago
-            six_months_ago = datetime.now() - timedelta(days=6*30)  # Using a rough estimate of 6 months
-            six_months_ago_timestamp = int(six_months_ago.timestamp() * 1000)  # Convert to the same format used in the data
-
-            # Fetching the data and calculating ratings
-            end_date = datetime.now()
-            start_date = datetime(2018, 1, 1)
-            data = fetch_data(start_date, end_date, 'NA')
-
-            # Get the latest game timestamp for each player
-            latest_game_timestamps = {}
-            for game in data:
-                for player in game['players']:
-                    user_id = player['user']['id']
-                    game_timestamp = game['timestamp']
-                    if user_id not in latest_game_timestamps or game_timestamp > latest_game_timestamps[user_id]:
-                        latest_game_timestamps[user_id] = game_timestamp
-
-            # Filter players based on activity and minimum games played criteria
-            active_players = {user_id for user_id, timestamp in latest_game_timestamps.items() if timestamp >= six_months_ago_timestamp}
-            player_ratings, _, games_played, _ = calculate_ratings(data, queue='NA')
-            players_list = [{'id': user_id, 'mu': rating.mu, 'sigma': rating.sigma} for user_id, rating in player_ratings.items() 
-                            if user_id in active_players and games_played[user_id] >= min_games]
-
-            players_list.sort(key=lambda x: x['mu'], reverse=True)
+            players_list = get_leaderboard_players(min_games)
 
             # Constants for formatting
             COLUMNS = 3
@@ -462,15 +347,14 @@ class StatsCog(commands.Cog):
 
             # If the input is a string, check if it's in our name mapping or do a partial match search
             elif isinstance(player_input, str):
-                if player_input in player_name_mapping.values():
-                    player_id = next(k for k, v in player_name_mapping.items() if v == player_input)
-                    display_name = player_input
-                else:
-                    player_id = next((k for k, v in player_name_mapping.items() if player_input.lower() in v.lower()), None)
-                    if not player_id:
-                        await ctx.send(f"Cannot find a player with the name {player_input}.")
-                        return
-                    display_name = player_name_mapping.get(player_id, player_input)  # Use the mapped name if available
+                player_id, candidates = find_player(player_input)
+                if candidates:
+                    await ctx.send(f"Multiple players found with similar names ({', '.join(candidates)}). Please be more specific.")
+                    return
+                if not player_id:
+                    await ctx.send(f"Cannot find a player with the name {player_input}.")
+                    return
+                display_name = player_name_mapping.get(player_id, player_input)  # Use the mapped name if available
 
             # Fetch data using the ALL queue
             start_date = datetime(2018, 1, 1)
@@ -532,13 +416,31 @@ class StatsCog(commands.Cog):
 
     
     @commands.command()
-    async def gamelengths(self, ctx, queue: str = 'ALL'):
+    async def gamelengths(self, ctx, queue: str = 'ALL', breakdown: str = None):
         try:
+            # Average length per month or per map instead of the chart
+            if breakdown in ('month', 'map'):
+                if breakdown == 'month':
+                    rows = get_game_lengths_by_month(queue)[-GAME_LENGTH_BREAKDOWN_ROWS:]
+                else:
+                    rows = get_game_lengths_by_map(queue)[:GAME_LENGTH_BREAKDOWN_ROWS]
+                if not rows:
+                    await ctx.send(f"No game lengths found for the {queue} queue.")
+                    return
+
+                table = "\n".join(f"{label:<18} {count:>5} {mean:>6.1f}m" for label, count, mean in rows)
+                embed = discord.Embed(title=f"Game Length by {breakdown.capitalize()}", description=f"```{'':<18} {'Games':>5} {'Avg':>7}\n{table}```", color=discord.Colour.blue())
+                await ctx.send(embed=embed)
+                return
+            elif breakdown is not None:
+                await ctx.send("Usage: `!gamelengths [queue] [month|map]`")
+                return
+
             # Fetch and process the data
-            timestamps, game_lengths = get_game_lengths(queue)
+            game_lengths_smoothed = get_smoothed_game_lengths(queue)
 
             # Plot the data and get the filename
-            filename = plot_game_lengths(timestamps, game_lengths, queue)
+            filename = plot_game_lengths(game_lengths_smoothed, queue)
 
             # Send the image to Discord
             file = discord.File(filename, filename=filename.split('/')[-1])
@@ -551,6 +453,83 @@ class StatsCog(commands.Cog):
 
 
 
+    @commands.command()
+    async def ratinghistory(self, ctx, *, args: str = ""):
+        if not ctx.guild:
+            await ctx.send("This command can only be used within a server.")
+            return
+
+        allowed_user_id = 252190261734670336
+
+        if ctx.author.id != allowed_user_id:
+            embed = Embed(title="Permission Denied", description="This command is restricted.", color=0xff0000)
+            await ctx.send(embed=embed)
+            return
+
+        try:
+            # An optional date at the end shows the rating on that day instead of the monthly history
+            parts = args.split()
+            as_of = None
+            if parts:
+                try:
+                    as_of = datetime.strptime(parts[-1], '%Y-%m-%d')
+                    parts = parts[:-1]
+                except ValueError:
+                    pass
+            player_input = " ".join(parts)
+
+            if ctx.message.mentions:
+                player_id = ctx.message.mentions[0].id
+            elif player_input:
+                player_id, candidates = find_player(player_input)
+                if candidates:
+                    await ctx.send(f"Multiple players found with similar names ({', '.join(candidates)}). Please be more specific.")
+                    return
+                if not player_id:
+                    await ctx.send(f"Cannot find a player with the name {player_input}.")
+                    return
+            else:
+                await ctx.send("Usage: `!ratinghistory [@User|name] [optional YYYY-MM-DD]`")
+                return
+
+            timeline = get_rating_timeline('NA')
+            display_name = player_name_mapping.get(player_id, timeline.names.get(player_id, player_input))
+
+            if as_of:
+                # Everything up to the end of that day
+                ratings = timeline.get_ratings_as_of(int((as_of + timedelta(days=1)).timestamp() * 1000) - 1)
+                rating = ratings.get(player_id)
+                if not rating:
+                    await ctx.send(f"{display_name} had not played a rated game by {as_of:%Y-%m-%d}.")
+                    return
+                position = sum(1 for other in ratings.values() if other.mu > rating.mu) + 1
+                embed = Embed(title=f"{display_name}'s Rating on {as_of:%Y-%m-%d}", color=Colour.blue())
+                embed.add_field(name="Rating", value=f"µ: {rating.mu:.2f}, σ: {rating.sigma:.2f}", inline=True)
+                embed.add_field(name="Position", value=f"{position} of {len(ratings)}", inline=True)
+                await ctx.send(embed=embed)
+                return
+
+            timestamps, mu, sigma = timeline.get_player_trajectory(player_id)
+            if not len(timestamps):
+                await ctx.send(f"No rated games found for {display_name}.")
+                return
+
+            # The rating after the last game of each month
+            months = timestamps.astype('datetime64[ms]').astype('datetime64[M]').astype(str)
+            month_ends = [i for i in range(len(months)) if i == len(months) - 1 or months[i] != months[i + 1]]
+            table = "\n".join(f"{months[i]:<8} {mu[i]:>6.2f} {sigma[i]:>5.2f}" for i in month_ends[-RATING_HISTORY_ROWS:])
+
+            peak = int(mu.argmax())
+            embed = Embed(title=f"{display_name}'s Rating History", description=f"```{'':<8} {'µ':>6} {'σ':>5}\n{table}```", color=Colour.blue())
+            embed.add_field(name="Games", value=str(len(timestamps)), inline=True)
+            embed.add_field(name="Peak", value=f"µ: {mu[peak]:.2f} ({months[peak]})", inline=True)
+            await ctx.send(embed=embed)
+
+        except Exception as e:
+            embed = Embed(title="Error", description="An error occurred while fetching the rating history.", color=0xff0000)
+            await ctx.send(embed=embed)
+            print(f"Error in !ratinghistory command: {e}")
+
     @commands.command()
     async def gamehistory(self, ctx, number_of_maps: int = 5):
         # Checking if number of maps requested is within limits
@@ -558,8 +537,8 @@ class StatsCog(commands.Cog):
             await ctx.send("Error: Cannot fetch more than 10 maps.")
             return
 
-        # Parsing game history from channel
-        maps = await parse_game_history_from_channel(ctx.channel, number_of_maps)
+        # Recent maps come from the channel's cached map history
+        maps = await get_recent_maps(ctx.channel, number_of_maps)
         
         if not maps:
             await ctx.send("No maps found in recent history.")
@@ -576,15 +555,6 @@ class StatsCog(commands.Cog):
 
         await ctx.send(embed=embed)
 
-def determine_rank(percentile):
-    if percentile >= 0.95: return "Grandmaster"
-    if percentile >= 0.85: return "Master"
-    if percentile >= 0.70: return "Diamond"
-    if percentile >= 0.40: return "Platinum"
-    if percentile >= 0.25: return "Gold"
-    if percentile >= 0.15: return "Silver"
-    return "Bronze"
-
 def calculate_last_played(player_id, game_data):
     for game in reversed(game_data):
         for player in game['players']:
@@ -620,21 +590,3 @@ def time_ago(past):
         return "{} month(s) ago".format(int(delta_months))
     else:
         return "{} year(s) ago".format(int(delta_years))
-    
-
-
-def get_game_lengths(queue):
-    """
-    Fetch game data, calculate game lengths and return them.
-    :param queue: The game queue.
-    :return: List of timestamps and game lengths.
-    """
-    start_date = datetime(2018, 1, 1)
-    end_date = datetime.now()
-    game_data = fetch_data(start_date, end_date, queue)
-
-    # Calculate the game lengths and their respective timestamps
-    timestamps = [game['timestamp'] for game in game_data]
-    game_lengths = [(game['completionTimestamp'] - game['timestamp']) / (60 * 1000) for game in game_data]  # in minutes
-
-    return timestamps, game_lengths
\ No newline at end of file
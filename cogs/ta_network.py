@@ -1,4 +1,5 @@
 import json
+import hashlib
 import subprocess
 import asyncio
 import os
@@ -10,6 +11,7 @@ from discord.ext import commands, tasks
 from filelock import FileLock
 from discord import Embed
 from modules.embeds_formatting import format_time
+from modules.data_managment import iter_json_array, write_json_array
 
 # Countdown
 countdown_task = None
@@ -469,61 +471,79 @@ class TANetworkCog(commands.Cog):
 
 
 
+def game_digest(game):
+    """
+    Hash the fields that identify a completed game (server id, map, scores, players and timeRemaining).
+    Returns a fixed-size digest, so duplicates can be detected without keeping the game itself in memory.
+    """
+    projection = {
+        "id": game.get("id"),
+        "map": game.get("map"),
+        "scores": game.get("scores"),
+        "players": game.get("players"),
+        "timeRemaining": game.get("timeRemaining"),
+    }
+    canonical = json.dumps(projection, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).digest()
+
+
 def remove_duplicate_games():
     completed_games_file = os.path.join(DATA_DIR, "completed_games.json")
+    temp_games_file = completed_games_file + ".tmp"
 
-    # Step 1: Load the completed_games.json file into memory.
-    with open(completed_games_file, 'r') as file:
-        games = json.load(file)
-
-    unique_games = {}
+    seen_digests = set()
     server_counts = defaultdict(int)
     cleaned_server_counts = defaultdict(int)
+    counts = {"original": 0}
+
+    def unique_games():
+        # Stream the games one at a time, only keeping a 16 byte digest for each game seen.
+        for game in iter_json_array(completed_games_file):
+            counts["original"] += 1
+            original_server_name = game.get('name', 'Unknown Server')
+            server_counts[original_server_name] += 1
+
+            server_name = original_server_name.lower()  # Convert to lowercase for case-insensitive checks
+            gamemode = game.get("map", {}).get("gamemode")
+            timeRemaining = game.get("timeRemaining", 0)
+            scores = game.get("scores", {})
+            BE_score = scores.get("bloodEagle", 0)
+            DS_score = scores.get("diamondSword", 0)
+
+            # Cleaning conditions
+            if len(game.get('players', [])) < 2:
+                cleaned_server_counts[original_server_name] += 1
+                continue
+            if timeRemaining > 1080 and "cap" not in server_name:
+                cleaned_server_counts[original_server_name] += 1
+                continue
+            if gamemode == "CTF" and (BE_score > 10 or DS_score > 10) and "cap" not in server_name:
+                cleaned_server_counts[original_server_name] += 1
+                continue
 
-    # Step 2: Count all games before processing
-    for game in games:
-        server_name = game.get('name', 'Unknown Server')
-        server_counts[server_name] += 1
-
-    # Step 3: Process each game and store in unique_games.
-    for game in games:
-        server_name = game.get('name', 'Unknown Server').lower()  # Convert to lowercase for case-insensitive checks
-        gamemode = game.get("map", {}).get("gamemode")
-        timeRemaining = game.get("timeRemaining", 0)
-        scores = game.get("scores", {})
-        BE_score = scores.get("bloodEagle", 0)
-        DS_score = scores.get("diamondSword", 0)
-
-        # Cleaning conditions
-        if len(game.get('players', [])) < 2:
-            cleaned_server_counts[game.get('name', 'Unknown Server')] += 1
-            continue
-        if timeRemaining > 1080 and "cap" not in server_name:
-            cleaned_server_counts[game.get('name', 'Unknown Server')] += 1
-            continue
-        if gamemode == "CTF" and (BE_score > 10 or DS_score > 10) and "cap" not in server_name:
-            cleaned_server_counts[game.get('name', 'Unknown Server')] += 1
-            continue
-
-        # Create a unique key for the game excluding the completionTimestamp.
-        key = json.dumps({k: v for k, v in game.items() if k != "completionTimestamp"})
-
-        if key not in unique_games:
-            unique_games[key] = game
+            digest = game_digest(game)
+            if digest in seen_digests:
+                continue
+            seen_digests.add(digest)
+            yield game
 
     # File size before
     file_size_before = os.path.getsize(completed_games_file)
 
-    # Step 4: Write the cleaned data back to completed_games.json.
-    with open(completed_games_file, 'w') as file:
-        json.dump(list(unique_games.values()), file)
+    # Write the surviving games to a temp file, then swap it in atomically.
+    try:
+        unique_count = write_json_array(temp_games_file, unique_games())
+        os.replace(temp_games_file, completed_games_file)
+    finally:
+        if os.path.exists(temp_games_file):
+            os.remove(temp_games_file)
 
     # File size after
     file_size_after = os.path.getsize(completed_games_file)
 
     return {
-        "original_count": len(games),
-        "unique_count": len(unique_games),
+        "original_count": counts["original"],
+        "unique_count": unique_count,
         "file_size_before": file_size_before,
         "file_size_after": file_size_after,
         "server_counts": server_counts,
@@ -6,7 +6,7 @@ from discord import Embed
 from modules.charts import create_map_weights_chart
 from data.user_roles import bot_admins
 from data.player_mappings import player_name_mapping
-from modules.data_managment import load_from_bson
+from modules.map_catalog import get_map_weights, get_arena_map_weights
 
 # Initialize the configparser and read the config.ini
 config = configparser.ConfigParser()
@@ -31,6 +31,7 @@ class UtilitiesCog(commands.Cog):
                 "!clear": "Clear the bot's messages from the last 10 mins.",
                 "!match": "Simulate a game starting.",
                 "!ranks": "Show player ranks.",
+                "!ratinghistory": "Show a player's rating by month, or on a given day. Usage: `!ratinghistory [@User|name] [optional YYYY-MM-DD]`",
                 "!startgame": "Simulate when teams have been picked."
             },
             "Elevated Admin": {
@@ -43,7 +44,7 @@ class UtilitiesCog(commands.Cog):
                 "!setcapvalue": "Sets a users cap value. Usage: setcapvalue [@User][capvalue]"
             },
             "Others": {
-                "!gamelengths": "Shows a graph of game lengths over time.",
+                "!gamelengths": "Shows a graph of game lengths over time. Usage: gamelengths [queue] [month|map] for averages per month or map.",
                 "!gamehistory": "Shows the last few maps played (Max 10). Usage: `!gamehistory [optional_history_count]`",
                 "!help": "Shows a list of commands and how to use them.",
                 "!info": "Shows map weighting for generated games, and voting thresholds.",
@@ -66,9 +67,9 @@ class UtilitiesCog(commands.Cog):
 
     @commands.command(name='info')
     async def info(self, ctx):
-        # Load both map weights from their BSON files
-        map_weights = load_from_bson(os.path.join(DATA_DIR, 'map_weights.bson'))
-        arena_map_weights = load_from_bson(os.path.join(DATA_DIR, 'arena_map_weights.bson'))
+        # Load both map weights from the map catalog
+        map_weights = get_map_weights()
+        arena_map_weights = get_arena_map_weights()
 
         filename = create_map_weights_chart(map_weights, arena_map_weights)
 
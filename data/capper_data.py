@@ -1,3 +1,4 @@
+# Seed for data/player_registry.jsonl, which holds the live capper values once created (see modules/player_registry.py)
 capper_value_mapping = {
     1146906869827391529: 0.8,  # Evil2
     266832474061930497: 0.6,  # Nerve
@@ -1,3 +1,4 @@
+# Seed for data/player_registry.jsonl, which holds the live names once created (see modules/player_registry.py)
 player_name_mapping = {
     376220786328862720: "Karuciel",
     283420459708710913: "Gred",
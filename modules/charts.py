@@ -76,29 +76,14 @@ def create_rolling_percentage_chart(player_id, data, queue_type):
     plt.close()
     return filename
 
-def plot_game_lengths(timestamps, game_lengths, queue):
+def plot_game_lengths(game_lengths_smoothed, queue):
     """
     Plot the game lengths over games played and save it to a file.
-    :param timestamps: List of game timestamps.
-    :param game_lengths: List of game lengths.
+    :param game_lengths_smoothed: Moving average of the game lengths, in the order the games were played.
     :param queue: The queue for which the data pertains.
     :return: Filename of the saved plot.
     """
     
-    SMOOTHNESS_WINDOW = 40  # Window size for moving average smoothness
-
-    # Filter out anomalies in game lengths
-    valid_indices = [i for i, length in enumerate(game_lengths) if 20 <= length <= 60]
-    game_lengths = [game_lengths[i] for i in valid_indices]
-    timestamps = [timestamps[i] for i in valid_indices]
-
-    # Sorting the data based on timestamps to get them in order
-    sorted_indices = np.argsort(timestamps)
-    game_lengths = np.array(game_lengths)[sorted_indices]
-
-    # Apply a simple moving average to smooth the line
-    game_lengths_smoothed = np.convolve(game_lengths, np.ones(SMOOTHNESS_WINDOW) / SMOOTHNESS_WINDOW, mode='valid')
-    
     # Create an x-axis for games played
     games_played = np.arange(len(game_lengths_smoothed))
 
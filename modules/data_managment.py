@@ -1,5 +1,6 @@
 import os
 import bson
+import hashlib
 import requests
 import json
 from datetime import datetime
@@ -16,26 +17,37 @@ if not os.path.exists(CACHE_DIR):
 CACHE_FILE_PATH = os.path.join(CACHE_DIR, "cache.json")
 TEMP_CACHE_FILE_PATH = os.path.join(CACHE_DIR, "temp_cache.json")
 
-def fetch_data(start_date, end_date, queue):
-    base_url = 'http://50.116.36.119/api/server/'
-    
-    # Define the mapping for URLs, JSON replaces, and queue filters
-    queue_mapping = {
-        '2v2': {
-            'urls': [base_url + '631438713183797258/games'],
-            'queue_filters': ['2v2']
-        },
-        'NA': {
-            'urls': [base_url + '631438713183797258/games'],
-            'queue_filters': ['PUGz']
-        },
-        'ALL': {  # Combined data fetching for both 2v2 and PUG
-            'urls': [base_url + '631438713183797258/games', base_url + '631438713183797258/games'],
-            'queue_filters': ['2v2', 'PUGz']
-        }
-    }
+# Queue -> the API queue names its games come from, in the order they are cached
+QUEUE_FILTERS = {
+    '2v2': ['2v2'],
+    'NA': ['PUGz'],
+    'ALL': ['2v2', 'PUGz']  # Combined data for both 2v2 and PUG
+}
+
+# Stats API, can be pointed elsewhere (e.g. at a local stub) with the GAMES_URL environment variable
+GAMES_URL = os.environ.get('GAMES_URL', 'http://50.116.36.119/api/server/631438713183797258/games')
+
+def split_games_by_queue(game_data, start_date, end_date):
+    """
+    Split one API payload into the games of every queue in QUEUE_FILTERS, in a single pass.
+    :return: {queue: games}, each list in the same order fetch_data caches it.
+    """
+    by_filter = {queue_filter: [] for queue_filters in QUEUE_FILTERS.values() for queue_filter in queue_filters}
+    for game in game_data:
+        games = by_filter.get(game['queue']['name'])
+        if games is not None and start_date <= datetime.fromtimestamp(game['timestamp'] / 1000) <= end_date:
+            games.append(game)
+    return {queue: [game for queue_filter in queue_filters for game in by_filter[queue_filter]]
+            for queue, queue_filters in QUEUE_FILTERS.items()}
 
-    if queue not in queue_mapping:
+def save_queue_cache(queue, game_data):
+    queue_cache_file_path = os.path.join(CACHE_DIR, f"{queue}_cache.json")
+    with FileLock(queue_cache_file_path + ".lock"):
+        with open(queue_cache_file_path, 'w') as f:
+            json.dump(game_data, f)
+
+def fetch_data(start_date, end_date, queue):
+    if queue not in QUEUE_FILTERS:
         raise ValueError(f"Invalid queue: {queue}")
 
     # Define cache file path for the desired queue
@@ -45,8 +57,7 @@ def fetch_data(start_date, end_date, queue):
     if os.path.exists(queue_cache_file_path):
         try:
             with FileLock(queue_cache_file_path + ".lock"):
-                with open(queue_cache_file_path, 'r') as f:
-                    cached_data = json.load(f)
+                cached_data = load_game_cache(queue_cache_file_path)
                 print(f"Loaded {len(cached_data)} games from cache for {queue} queue.")
                 return cached_data
         except json.JSONDecodeError:
@@ -54,23 +65,51 @@ def fetch_data(start_date, end_date, queue):
             return []
 
 
-    # If no cached data, fetch from the API
-    combined_data = []
-    for url, queue_filter in zip(queue_mapping[queue]['urls'], queue_mapping[queue]['queue_filters']):
-        response = requests.get(url)
-        game_data = json.loads(response.text)
-        
-        filtered_data = [game for game in game_data
-                         if game['queue']['name'] == queue_filter
-                         and start_date <= datetime.fromtimestamp(game['timestamp'] / 1000) <= end_date]
-        combined_data.extend(filtered_data)
-
-        # Save the fetched data to cache for future use
-        with open(queue_cache_file_path, 'w') as f:
-            json.dump(combined_data, f)
-        print(f"Fetched and cached {len(combined_data)} games for {queue} queue.")
+    # If no cached data, fetch from the API once and cache every queue from the same payload
+    response = requests.get(GAMES_URL)
+    queue_games = split_games_by_queue(json.loads(response.text), start_date, end_date)
+    for cached_queue, game_data in queue_games.items():
+        save_queue_cache(cached_queue, game_data)
+        print(f"Fetched and cached {len(game_data)} games for {cached_queue} queue.")
     
-    return combined_data
+    return queue_games[queue]
+
+def get_cache_version(queue):
+    """
+    Version of a queue's game cache file, as (modification time, size), or None if there is no cache yet.
+    Results derived from the cache can be kept until this changes.
+    """
+    try:
+        stat = os.stat(os.path.join(CACHE_DIR, f"{queue}_cache.json"))
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def get_data_ends(data):
+    """The number of games and the timestamps at either end, which change whenever games are added."""
+    if not data:
+        return (0, None, None)
+    return (len(data), data[0]['timestamp'], data[-1]['timestamp'])
+
+def get_data_digest(data):
+    """Hash of the fields the bot reads from every game, so corrections to games already in the data are noticed."""
+    digest = hashlib.blake2b(digest_size=16)
+    users = {}
+    queues = {}
+    for game in data:
+        digest.update(json.dumps(project_game(game, users, queues), separators=(',', ':')).encode('utf-8'))
+    return digest.digest()
+
+def get_data_version(data):
+    """
+    Fingerprint of a list of games: get_data_ends and get_data_digest. Changes whenever games are added
+    or corrected, so results derived from the data can be cached against it.
+    """
+    return get_data_ends(data) + (get_data_digest(data),)
+
+def matches_data_version(data, version):
+    """Whether data is what version was taken from. The ends are compared first, so most changes skip the digest."""
+    return version is not None and version[:3] == get_data_ends(data) and version[3] == get_data_digest(data)
 
 def save_to_bson(data, filepath):
     """Save the data to a BSON file."""
@@ -84,3 +123,110 @@ def load_from_bson(filepath):
     with open(filepath, 'rb') as f:
         return bson.BSON(f.read()).decode()
 
+
+
+def iter_json_array(filepath, chunk_size=64 * 1024):
+    """
+    Yield the elements of a top-level JSON array one at a time.
+
+    Only the current chunk of the file and the element being decoded are held in memory,
+    so very large game histories can be walked without loading the whole list.
+    """
+    decoder = json.JSONDecoder()
+    with open(filepath, 'r', encoding='utf-8') as f:
+        buffer = f.read(chunk_size)
+        eof = not buffer
+        pos = 0
+
+        def skip_whitespace(buffer, pos):
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            return pos
+
+        pos = skip_whitespace(buffer, pos)
+        while pos == len(buffer) and not eof:
+            buffer = f.read(chunk_size)
+            eof = not buffer
+            pos = skip_whitespace(buffer, 0)
+        if buffer[pos:pos + 1] != '[':
+            raise json.JSONDecodeError("Expected a JSON array", buffer, pos)
+        pos += 1
+
+        while True:
+            pos = skip_whitespace(buffer, pos)
+            if pos < len(buffer) and buffer[pos] == ',':
+                pos = skip_whitespace(buffer, pos + 1)
+            if pos < len(buffer) and buffer[pos] == ']':
+                return
+
+            try:
+                # Only trust a decode that is followed by a delimiter (or EOF),
+                # otherwise a number or literal may have been cut in half by the chunking.
+                element, end = decoder.raw_decode(buffer, pos)
+                if eof or (end < len(buffer) and buffer[end] in ' \t\r\n,]'):
+                    yield element
+                    pos = end
+                    continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+
+            # Drop everything already consumed and read the next chunk
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+
+def project_game(game, users, queues):
+    """
+    Keep only the game fields the bot reads, in the same shape as the API's game dicts.
+    User and queue dicts are shared between games, so each player's name is stored once.
+    """
+    queue_name = game['queue']['name']
+    queue = queues.get(queue_name)
+    if queue is None:
+        queue = queues[queue_name] = {'name': queue_name}
+
+    players = []
+    for player in game['players']:
+        user_key = (player['user']['id'], player['user']['name'])
+        user = users.get(user_key)
+        if user is None:
+            user = users[user_key] = {'id': user_key[0], 'name': user_key[1]}
+        players.append({'user': user, 'team': player['team'], 'pickOrder': player['pickOrder']})
+
+    return {
+        'timestamp': game['timestamp'],
+        'completionTimestamp': game['completionTimestamp'],
+        'winningTeam': game['winningTeam'],
+        'queue': queue,
+        'players': players
+    }
+
+
+def load_game_cache(filepath):
+    """
+    Load a cached list of games, streaming the file and projecting each game as it is decoded,
+    so the full API dicts never exist all at once. The shared user and queue dicts must not be modified.
+    """
+    users = {}
+    queues = {}
+    return [project_game(game, users, queues) for game in iter_json_array(filepath)]
+
+
+def write_json_array(filepath, elements):
+    """
+    Write an iterable of JSON-serializable elements to a file as a single JSON array,
+    one element at a time. Returns the number of elements written.
+    """
+    count = 0
+    with open(filepath, 'w', encoding='utf-8') as f:
+        f.write('[')
+        for element in elements:
+            if count:
+                f.write(', ')
+            json.dump(element, f)
+            count += 1
+        f.write(']')
+    return count
@@ -0,0 +1,253 @@
+import os
+import mmap
+import json
+import struct
+
+import numpy as np
+from filelock import FileLock
+
+from modules.data_managment import iter_json_array, write_json_array
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
+# File layout: header, then the games, slots, ids, string offsets and string data sections
+ARCHIVE_MAGIC = b'PUGARCH1'
+HEADER_FORMAT = '<8s5I5Q'
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+FORMAT_VERSION = 1
+
+# Stored in place of a missing (null) value
+MISSING = -1
+
+# One fixed-width header per game. Its players are slots[first_slot:first_slot + slot_count].
+GAME_DTYPE = np.dtype([
+    ('timestamp', '<i8'),               # ms since epoch
+    ('completion_timestamp', '<i8'),    # ms since epoch
+    ('queue_id', '<i8'),
+    ('queue_name', '<u4'),              # index into the string dictionary
+    ('first_slot', '<u4'),
+    ('slot_count', '<u2'),
+    ('winning_team', '<i1'),
+])
+
+# One row per player per game
+SLOT_DTYPE = np.dtype([
+    ('player', '<u4'),                  # index into the id dictionary
+    ('name', '<u4'),                    # index into the string dictionary (the name at the time of the game)
+    ('pick_order', '<i2'),
+    ('team', '<i1'),
+    ('captain', '<i1'),
+])
+
+# Open archives by path, with the modification time of the file they were opened at
+open_archives = {}
+
+
+def encode_optional(value):
+    return MISSING if value is None else value
+
+
+def decode_optional(value):
+    value = int(value)
+    return None if value == MISSING else value
+
+
+class GameArchive:
+    """
+    Read-only, memory-mapped view of an archive written by write_game_archive.
+
+    `games` and `slots` are NumPy structured arrays backed directly by the file, so columns like
+    games['timestamp'] or slots['player'] can be scanned without parsing or copying. `ids` maps player
+    indexes to Discord ids and `get_string` decodes entries of the string dictionary.
+    """
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, game_count, slot_count, id_count, string_count,
+         games_offset, slots_offset, ids_offset, string_offsets_offset, strings_offset) = struct.unpack_from(HEADER_FORMAT, self.mmap, 0)
+        if magic != ARCHIVE_MAGIC or version != FORMAT_VERSION:
+            self.mmap.close()
+            raise ValueError(f"{filepath} is not a version {FORMAT_VERSION} game archive.")
+
+        self.games = np.frombuffer(self.mmap, dtype=GAME_DTYPE, count=game_count, offset=games_offset)
+        self.slots = np.frombuffer(self.mmap, dtype=SLOT_DTYPE, count=slot_count, offset=slots_offset)
+        self.ids = np.frombuffer(self.mmap, dtype='<u8', count=id_count, offset=ids_offset)
+        self.string_offsets = np.frombuffer(self.mmap, dtype='<u4', count=string_count + 1, offset=string_offsets_offset)
+        self.strings_offset = strings_offset
+        self.string_cache = {}
+
+    def __len__(self):
+        return len(self.games)
+
+    def get_string(self, index):
+        index = int(index)
+        string = self.string_cache.get(index)
+        if string is None:
+            start = self.strings_offset + int(self.string_offsets[index])
+            end = self.strings_offset + int(self.string_offsets[index + 1])
+            string = self.string_cache[index] = self.mmap[start:end].decode('utf-8')
+        return string
+
+    def get_slots(self, game_index):
+        game = self.games[game_index]
+        start = int(game['first_slot'])
+        return self.slots[start:start + int(game['slot_count'])]
+
+    def get_game(self, game_index):
+        """Returns a game in the same dict shape as the JSON game caches."""
+        game = self.games[game_index]
+        return {
+            'timestamp': int(game['timestamp']),
+            'completionTimestamp': decode_optional(game['completion_timestamp']),
+            'winningTeam': decode_optional(game['winning_team']),
+            'queue': {'id': decode_optional(game['queue_id']), 'name': self.get_string(game['queue_name'])},
+            'players': [
+                {
+                    'user': {'id': int(self.ids[slot['player']]), 'name': self.get_string(slot['name'])},
+                    'team': decode_optional(slot['team']),
+                    'captain': decode_optional(slot['captain']),
+                    'pickOrder': decode_optional(slot['pick_order'])
+                } for slot in self.get_slots(game_index)
+            ]
+        }
+
+    def iter_games(self):
+        for game_index in range(len(self.games)):
+            yield self.get_game(game_index)
+
+    def close(self):
+        # Drop the array views first, an mmap can't be closed while buffers into it are alive
+        self.games = self.slots = self.ids = self.string_offsets = None
+        self.mmap.close()
+
+
+def write_game_archive(filepath, games):
+    """
+    Write games (dicts shaped like the JSON game caches) to a binary archive.
+    The file is written next to the target and swapped in, so open readers never see a partial archive.
+
+    :return: Number of games written.
+    """
+    strings = {}
+    ids = {}
+    game_rows = []
+    slot_rows = []
+
+    def string_index(value):
+        if value not in strings:
+            strings[value] = len(strings)
+        return strings[value]
+
+    def id_index(value):
+        if value not in ids:
+            ids[value] = len(ids)
+        return ids[value]
+
+    for game in games:
+        game_rows.append((
+            game['timestamp'],
+            encode_optional(game.get('completionTimestamp')),
+            encode_optional(game['queue'].get('id')),
+            string_index(game['queue']['name']),
+            len(slot_rows),
+            len(game['players']),
+            encode_optional(game.get('winningTeam'))
+        ))
+        for player in game['players']:
+            slot_rows.append((
+                id_index(player['user']['id']),
+                string_index(player['user']['name']),
+                encode_optional(player.get('pickOrder')),
+                encode_optional(player.get('team')),
+                encode_optional(player.get('captain'))
+            ))
+
+    games_array = np.array(game_rows, dtype=GAME_DTYPE)
+    slots_array = np.array(slot_rows, dtype=SLOT_DTYPE)
+    ids_array = np.array(list(ids), dtype='<u8')
+    encoded = [string.encode('utf-8') for string in strings]
+    string_offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+    np.cumsum([len(string) for string in encoded], out=string_offsets[1:])
+
+    sections = [games_array.tobytes(), slots_array.tobytes(), ids_array.tobytes(), string_offsets.tobytes(), b''.join(encoded)]
+    offsets = []
+    position = HEADER_SIZE
+    for section in sections:
+        position += -position % 8  # Keep every section 8-byte aligned
+        offsets.append(position)
+        position += len(section)
+
+    temp_file = filepath + '.tmp'
+    with open(temp_file, 'wb') as f:
+        f.write(struct.pack(HEADER_FORMAT, ARCHIVE_MAGIC, FORMAT_VERSION, len(games_array), len(slots_array),
+                            len(ids_array), len(encoded), *offsets))
+        for offset, section in zip(offsets, sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(section)
+    os.replace(temp_file, filepath)
+    return len(games_array)
+
+
+def convert_json_to_archive(json_path, archive_path):
+    """Convert a JSON game cache (a top-level array of games) to an archive. Returns the number of games."""
+    return write_game_archive(archive_path, iter_json_array(json_path))
+
+
+def convert_archive_to_json(archive_path, json_path):
+    """Convert an archive back to a JSON game cache. Returns the number of games."""
+    archive = GameArchive(archive_path)
+    try:
+        return write_json_array(json_path, archive.iter_games())
+    finally:
+        archive.close()
+
+
+def get_archive_path(queue):
+    return os.path.join(CACHE_DIR, f"{queue}_cache.pugarc")
+
+
+def load_game_archive(queue):
+    """
+    Returns the archive for a queue's game cache, (re)building it from cache/<queue>_cache.json when the JSON
+    is newer. The open archive is reused until its file changes. Returns None if the queue has no cache yet.
+    """
+    json_path = os.path.join(CACHE_DIR, f"{queue}_cache.json")
+    archive_path = get_archive_path(queue)
+    if not os.path.exists(json_path):
+        return None
+
+    with FileLock(json_path + ".lock"):
+        # Rebuild on equal times too, in case both were written within the clock resolution of the filesystem
+        if not os.path.exists(archive_path) or os.path.getmtime(archive_path) <= os.path.getmtime(json_path):
+            # Unmap the old archive before replacing its file, which Windows doesn't allow while it is mapped
+            cached = open_archives.pop(archive_path, None)
+            if cached:
+                close_archive(cached[0])
+            try:
+                count = convert_json_to_archive(json_path, archive_path)
+            except json.JSONDecodeError:
+                print(f"Error converting cached data for {queue} queue. The cache file might be corrupt or empty.")
+                return None
+            print(f"Archived {count} games for {queue} queue.")
+
+    modified = os.path.getmtime(archive_path)
+    cached = open_archives.get(archive_path)
+    if cached and cached[1] == modified:
+        return cached[0]
+
+    if cached:
+        close_archive(cached[0])
+    archive = GameArchive(archive_path)
+    open_archives[archive_path] = (archive, modified)
+    return archive
+
+
+def close_archive(archive):
+    """Close an archive that is no longer cached. If its arrays are still in use, the mapping is freed once they are gone."""
+    try:
+        archive.close()
+    except BufferError:
+        pass
@@ -0,0 +1,113 @@
+from datetime import datetime
+
+import numpy as np
+
+from modules.data_managment import fetch_data, get_cache_version
+from modules.game_archive import load_game_archive
+from modules.map_history import get_map_timeline
+
+# Games outside this range (in minutes) are treated as anomalies
+MIN_GAME_LENGTH = 20
+MAX_GAME_LENGTH = 60
+
+# Window size for the moving average
+SMOOTHNESS_WINDOW = 40
+
+# (queue, cache version, what) -> result, only the latest version of each queue is kept
+game_length_cache = {}
+
+
+def cached(queue, what, compute):
+    version = get_cache_version(queue)
+    key = (queue, version, what)
+    if version is not None and key in game_length_cache:
+        return game_length_cache[key]
+
+    result = compute()
+    if version is not None:
+        for stale_key in [k for k in game_length_cache if k[0] == queue and k[1] != version]:
+            del game_length_cache[stale_key]
+        game_length_cache[key] = result
+    return result
+
+
+def get_game_columns(queue):
+    """Start and completion timestamps (ms) of every game in the queue, read from the game archive when there is one."""
+    archive = load_game_archive(queue)
+    if archive is not None:
+        return archive.games['timestamp'], archive.games['completion_timestamp']
+
+    game_data = fetch_data(datetime(2018, 1, 1), datetime.now(), queue)
+    return (np.array([game['timestamp'] for game in game_data], dtype=np.int64),
+            np.array([game['completionTimestamp'] for game in game_data], dtype=np.int64))
+
+
+def get_game_lengths(queue):
+    """
+    Game lengths for a queue, without anomalies and in the order the games were played.
+    :param queue: The game queue.
+    :return: (start timestamps in ms, completion timestamps in ms, game lengths in minutes) as NumPy arrays.
+    """
+    def compute():
+        timestamps, completion_timestamps = get_game_columns(queue)
+        game_lengths = (completion_timestamps - timestamps) / (60 * 1000)
+        valid = (game_lengths >= MIN_GAME_LENGTH) & (game_lengths <= MAX_GAME_LENGTH)
+        order = np.argsort(timestamps[valid], kind='stable')
+        return timestamps[valid][order], completion_timestamps[valid][order], game_lengths[valid][order]
+
+    return cached(queue, 'lengths', compute)
+
+
+def get_smoothed_game_lengths(queue, window=SMOOTHNESS_WINDOW):
+    """Moving average of the game lengths over `window` games (empty if there are fewer games than that)."""
+    def compute():
+        _, _, game_lengths = get_game_lengths(queue)
+        if len(game_lengths) < window:
+            return np.empty(0)
+        totals = np.concatenate(([0.0], np.cumsum(game_lengths)))
+        return (totals[window:] - totals[:-window]) / window
+
+    return cached(queue, ('smoothed', window), compute)
+
+
+def summarize_groups(labels, game_lengths):
+    """Returns [(label, number of games, mean length)] for each distinct label."""
+    groups, inverse = np.unique(labels, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(groups))
+    totals = np.bincount(inverse, weights=game_lengths, minlength=len(groups))
+    return [(group, int(count), float(total / count)) for group, count, total in zip(groups.tolist(), counts, totals)]
+
+
+def get_game_lengths_by_month(queue):
+    """[(month as 'YYYY-MM', games, mean length in minutes)], oldest month first."""
+    def compute():
+        timestamps, _, game_lengths = get_game_lengths(queue)
+        months = timestamps.astype('datetime64[ms]').astype('datetime64[M]').astype(str)
+        return summarize_groups(months, game_lengths)
+
+    return cached(queue, 'month', compute)
+
+
+def get_game_lengths_by_map(queue):
+    """
+    [(map, games, mean length in minutes)], most played first. A game's map is the first map posted
+    in the map history while the game was running, games without one are left out.
+    """
+    timeline = get_map_timeline()
+
+    def compute():
+        timestamps, completion_timestamps, game_lengths = get_game_lengths(queue)
+        if not timeline or not len(timestamps):
+            return []
+        map_timestamps = np.array([timestamp for timestamp, _ in timeline], dtype=np.int64)
+        map_names = np.array([name for _, name in timeline])
+
+        first_map = np.searchsorted(map_timestamps, timestamps, side='left')
+        matched = first_map < len(map_timestamps)
+        matched[matched] = map_timestamps[first_map[matched]] < completion_timestamps[matched]
+        summary = summarize_groups(map_names[first_map[matched]], game_lengths[matched])
+        return sorted(summary, key=lambda row: row[1], reverse=True)
+
+    # The map history changes on its own, so it is part of the key
+    map_version = (len(timeline), timeline[-1][0] if timeline else None)
+    return cached(queue, ('map', map_version), compute)
@@ -0,0 +1,99 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from modules.rating_engine import get_queue_ratings
+
+# Players without a game in this period are left off the leaderboard
+ACTIVE_PERIOD = timedelta(days=6*30)  # Using a rough estimate of 6 months
+
+# The snapshot for the current NA games, rebuilt when new games come in
+leaderboard_snapshot = None
+
+
+def determine_rank(percentile):
+    if percentile >= 0.95: return "Grandmaster"
+    if percentile >= 0.85: return "Master"
+    if percentile >= 0.70: return "Diamond"
+    if percentile >= 0.40: return "Platinum"
+    if percentile >= 0.25: return "Gold"
+    if percentile >= 0.15: return "Silver"
+    return "Bronze"
+
+
+class LeaderboardSnapshot:
+    """
+    Every rated NA player, sorted by mu (highest first), with their sigma, game count and last game.
+    Built once per data refresh and shared by !ranks, !listplayers and !pli.
+    """
+    def __init__(self, version, player_ratings, games_played, latest_game_timestamps):
+        self.version = version
+        ids = list(player_ratings.keys())
+        mu = np.array([player_ratings[user_id].mu for user_id in ids], dtype=float)
+
+        # A stable sort keeps ties in rating order, as the commands' list.sort did
+        order = np.argsort(-mu, kind='stable')
+        self.ids = [ids[i] for i in order]
+        self.mu = mu[order]
+        self.sigma = np.array([player_ratings[user_id].sigma for user_id in self.ids], dtype=float)
+        self.games = np.array([games_played[user_id] for user_id in self.ids], dtype=int)
+        self.last_played = np.array([latest_game_timestamps.get(user_id, 0) for user_id in self.ids], dtype=np.int64)
+        self.views = {}
+
+    def get_players(self, min_games, active_since):
+        """
+        Players with at least min_games games and a game since active_since (ms), highest mu first, as dicts with
+        id, mu, sigma, games, percentile and rank. The percentile is relative to the players in the list.
+        """
+        key = (min_games, active_since)
+        if key not in self.views:
+            # Lists for an earlier cutoff are outdated
+            self.views = {view_key: players for view_key, players in self.views.items() if view_key[1] == active_since}
+            positions = np.flatnonzero((self.last_played >= active_since) & (self.games >= min_games))
+            total_players = len(positions)
+            players = []
+            for index, position in enumerate(positions):
+                percentile = 1 - (index / total_players)
+                players.append({
+                    'id': self.ids[position],
+                    'mu': float(self.mu[position]),
+                    'sigma': float(self.sigma[position]),
+                    'games': int(self.games[position]),
+                    'percentile': percentile,
+                    'rank': determine_rank(percentile)
+                })
+            self.views[key] = players
+        return self.views[key]
+
+
+def get_latest_game_timestamps(data):
+    latest_game_timestamps = {}
+    for game in data:
+        game_timestamp = game['timestamp']
+        for player in game['players']:
+            user_id = player['user']['id']
+            if game_timestamp > latest_game_timestamps.get(user_id, -1):
+                latest_game_timestamps[user_id] = game_timestamp
+    return latest_game_timestamps
+
+
+def get_leaderboard():
+    """Returns the leaderboard snapshot, rebuilding it if the NA games have changed since it was built."""
+    global leaderboard_snapshot
+    queue_ratings = get_queue_ratings('NA')
+    if leaderboard_snapshot is not None and leaderboard_snapshot.version == queue_ratings.data_version:
+        return leaderboard_snapshot
+
+    leaderboard_snapshot = LeaderboardSnapshot(queue_ratings.data_version, queue_ratings.ratings, queue_ratings.games_played,
+                                               get_latest_game_timestamps(queue_ratings.game_data))
+    return leaderboard_snapshot
+
+
+def get_active_since():
+    """Start of the active period, from the start of today so lists can be reused through the day, in ms like the data."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((today - ACTIVE_PERIOD).timestamp() * 1000)
+
+
+def get_leaderboard_players(min_games):
+    return get_leaderboard().get_players(min_games, get_active_since())
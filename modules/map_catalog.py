@@ -0,0 +1,91 @@
+import os
+
+from data.map_url_mapping import map_url_mapping
+from data.map_commands import map_commands, map_commands_arena
+from modules.data_managment import load_from_bson
+from modules.map_history import normalize_map_name
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DATA_DIR = os.path.join(BASE_DIR, 'data', 'gamequeue')
+MAP_WEIGHTS_FILE = os.path.join(DATA_DIR, 'map_weights.bson')
+ARENA_MAP_WEIGHTS_FILE = os.path.join(DATA_DIR, 'arena_map_weights.bson')
+
+# Loaded on first use and dropped by invalidate_map_catalog, e.g. after !editmap
+catalog = None
+
+# Bumped on every invalidation, so anything derived from the catalog can tell when to rebuild
+catalog_version = 0
+
+
+def load_map_catalog():
+    """Returns the map catalog, loading the weights and building the lookups if needed."""
+    global catalog
+    if catalog is not None:
+        return catalog
+
+    map_weights = load_from_bson(MAP_WEIGHTS_FILE)
+    arena_map_weights = load_from_bson(ARENA_MAP_WEIGHTS_FILE)
+
+    catalog = {
+        'version': catalog_version,
+        'map_weights': map_weights,
+        'arena_map_weights': arena_map_weights,
+        'map_names': tuple(map_weights.keys()),
+        # Normalized (lowercase, no spaces) full map name -> shortcut
+        'shortcut_by_name': {normalize_map_name(name): shortcut for shortcut, name in map_commands.items()},
+        'arena_shortcut_by_name': {normalize_map_name(name): shortcut for shortcut, name in map_commands_arena.items()},
+    }
+    return catalog
+
+
+def invalidate_map_catalog():
+    """Forget the loaded catalog, the next lookup reloads it from the BSON files."""
+    global catalog, catalog_version
+    catalog = None
+    catalog_version += 1
+
+
+def get_catalog_version():
+    return load_map_catalog()['version']
+
+
+def get_map_weights():
+    return load_map_catalog()['map_weights']
+
+
+def get_arena_map_weights():
+    return load_map_catalog()['arena_map_weights']
+
+
+def get_map_names():
+    return load_map_catalog()['map_names']
+
+
+def get_map_url(map_name):
+    return map_url_mapping.get(map_name, map_url_mapping["N/A"])
+
+
+def resolve_map_shortcut(map_name):
+    """
+    Finds the shortcut for a map name as it appears in a '**Maps:**' embed.
+
+    An exact (normalized) name match is tried first, then the longest known map name the input starts with.
+    CTF maps take priority over arena maps. Each step is a dictionary lookup per prefix length,
+    so the cost depends on the length of the name rather than the number of maps.
+    """
+    catalog = load_map_catalog()
+    normalized = normalize_map_name(map_name)
+    if not normalized:
+        return None
+
+    for lookup in (catalog['shortcut_by_name'], catalog['arena_shortcut_by_name']):
+        if normalized in lookup:
+            return lookup[normalized]
+
+    for lookup in (catalog['shortcut_by_name'], catalog['arena_shortcut_by_name']):
+        for length in range(len(normalized) - 1, 0, -1):
+            shortcut = lookup.get(normalized[:length])
+            if shortcut:
+                return shortcut
+
+    return None
@@ -0,0 +1,202 @@
+import os
+import json
+from collections import deque
+from datetime import datetime
+
+import discord
+
+from data.shared_data import game_history_cache
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+MAP_HISTORY_FILE = os.path.join(BASE_DIR, 'data', 'maps_with_times.json')
+
+# Number of recent maps remembered per channel (!gamehistory shows at most 10)
+MAP_HISTORY_SIZE = 10
+
+# Channels whose history has already been walked once this session
+backfilled_channels = set()
+history_loaded = False
+
+# Entries from the legacy flat-list format, which has no channel ids. Kept so they are not lost on save.
+unattributed_history = []
+
+
+def normalize_map_name(map_name):
+    """Lowercase and strip spaces, so 'Dangerous Crossing' and 'dangerouscrossing' compare equal."""
+    return map_name.lower().replace(" ", "") if map_name else map_name
+
+
+def get_channel_history(channel_id):
+    """Returns the ring buffer of recent maps for a channel, newest first."""
+    load_map_history()
+    if channel_id not in game_history_cache:
+        game_history_cache[channel_id] = deque(maxlen=MAP_HISTORY_SIZE)
+    return game_history_cache[channel_id]
+
+
+def load_map_history():
+    """Load the persisted map history into game_history_cache (only once per session)."""
+    global history_loaded
+    if history_loaded:
+        return
+    history_loaded = True
+
+    if not os.path.exists(MAP_HISTORY_FILE):
+        return
+    try:
+        with open(MAP_HISTORY_FILE, 'r') as f:
+            stored = json.load(f)
+    except json.JSONDecodeError:
+        print("Error loading map history. The file might be corrupt or empty.")
+        return
+
+    # The legacy format was a flat list without channel ids, which can't be attributed to a channel
+    if isinstance(stored, list):
+        unattributed_history.extend(stored)
+        return
+    unattributed_history.extend(stored.pop("unattributed", []))
+
+    for channel_id, entries in stored.items():
+        history = deque(maxlen=MAP_HISTORY_SIZE)
+        for entry in entries[:MAP_HISTORY_SIZE]:
+            history.append({
+                "name": entry["maps"][0],
+                "date": datetime.utcfromtimestamp(entry["timestamp"] / 1000),
+                "message_id": entry.get("message_id")
+            })
+        game_history_cache[int(channel_id)] = history
+
+
+def save_map_history():
+    """Persist every channel's ring buffer to maps_with_times.json."""
+    stored = {
+        str(channel_id): [
+            {
+                "timestamp": int((entry["date"] - datetime(1970, 1, 1)).total_seconds() * 1000),
+                "maps": [entry["name"]],
+                "message_id": entry["message_id"]
+            } for entry in history
+        ] for channel_id, history in game_history_cache.items()
+    }
+    if unattributed_history:
+        stored["unattributed"] = unattributed_history
+    temp_file = MAP_HISTORY_FILE + ".tmp"
+    with open(temp_file, 'w') as f:
+        json.dump(stored, f, indent=4)
+    os.replace(temp_file, MAP_HISTORY_FILE)
+
+
+def record_map(channel_id, map_name, date, message_id=None, save=True):
+    """
+    Add a map that was just played to the front of the channel's ring buffer.
+    Maps that are older than everything already stored, or already known by message id, are ignored.
+    """
+    history = get_channel_history(channel_id)
+    if message_id is not None and any(entry["message_id"] == message_id for entry in history):
+        return False
+
+    entry = {"name": map_name, "date": date, "message_id": message_id}
+    if not history or date >= history[0]["date"]:
+        history.appendleft(entry)
+    elif len(history) < MAP_HISTORY_SIZE or date > history[-1]["date"]:
+        # Insert older entries (e.g. from a backfill) in date order
+        entries = sorted(list(history) + [entry], key=lambda e: e["date"], reverse=True)
+        history.clear()
+        history.extend(entries[:MAP_HISTORY_SIZE])
+    else:
+        return False
+
+    if save:
+        save_map_history()
+    return True
+
+
+def record_map_message(message):
+    """Record the map from a '**Maps:**' embed message. Returns the map name, or None if it isn't a map embed."""
+    if not message.embeds:
+        return None
+    description = message.embeds[0].description
+    if not description or "**Maps:**" not in description:
+        return None
+
+    map_name = description.split("**Maps:**")[1].strip()
+    naive_datetime = message.created_at.replace(tzinfo=None)
+    record_map(message.channel.id, map_name, naive_datetime, message.id)
+    return map_name
+
+
+async def backfill_map_history(channel):
+    """
+    Walk the channel's message history once to fill its ring buffer.
+    Later lookups are served from the buffer, which is kept current by record_map_message.
+    """
+    if channel.id in backfilled_channels:
+        return
+    backfilled_channels.add(channel.id)
+
+    try:
+        maps = await parse_game_history_from_channel(channel, MAP_HISTORY_SIZE)
+    except discord.HTTPException as e:
+        print(f"Failed to backfill map history for channel {channel.id}: {e}")
+        backfilled_channels.discard(channel.id)
+        return
+
+    added = False
+    for map_data in maps:
+        added |= record_map(channel.id, map_data["name"], map_data["date"], map_data["message_id"], save=False)
+    if added:
+        save_map_history()
+
+
+async def get_recent_maps(channel, limit=MAP_HISTORY_SIZE):
+    """Returns up to `limit` recent maps for the channel, newest first, as dicts with 'name' and 'date'."""
+    await backfill_map_history(channel)
+    return list(get_channel_history(channel.id))[:limit]
+
+
+async def parse_game_history_from_channel(channel, limit):
+    maps = []
+    last_message_id = None
+    continue_search = True
+
+    while len(maps) < limit and continue_search:
+        if last_message_id:
+            history = channel.history(limit=100, before=discord.Object(id=last_message_id))
+        else:
+            history = channel.history(limit=100)
+
+        fetched_messages = 0
+        async for message in history:
+            fetched_messages += 1
+
+            if len(maps) == limit:  # Stop once we have enough
+                break
+            if message.embeds:
+                embed = message.embeds[0]
+                description = embed.description
+                if description and "**Maps:**" in description:
+                    map_name = description.split("**Maps:**")[1].strip()
+                    naive_datetime = message.created_at.replace(tzinfo=None)
+                    maps.append({"name": map_name, "date": naive_datetime, "message_id": message.id})  # Store entire datetime
+
+            last_message_id = message.id
+
+        # If the loop didn't break due to the limit and we didn't fetch a full 100 messages,
+        # it means there's no more history
+        if fetched_messages < 100:
+            continue_search = False
+
+    return maps
+
+
+def get_map_timeline():
+    """
+    Every map in the history, including the legacy unattributed entries, as (timestamp in ms, normalized name)
+    sorted by time. Entries present in both are only listed once.
+    """
+    load_map_history()
+    timeline = {(entry["timestamp"], normalize_map_name(entry["maps"][0])) for entry in unattributed_history if entry.get("maps")}
+    for history in game_history_cache.values():
+        for entry in history:
+            timeline.add((int((entry["date"] - datetime(1970, 1, 1)).total_seconds() * 1000), normalize_map_name(entry["name"])))
+    return sorted(timeline)
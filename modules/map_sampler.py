@@ -0,0 +1,114 @@
+import random
+
+from modules.map_catalog import get_catalog_version, get_map_weights
+from modules.map_history import normalize_map_name
+
+# Alias draws tried before falling back to an exact draw over the remaining maps
+MAX_ALIAS_ATTEMPTS = 32
+
+# Built lazily from the map catalog, and rebuilt when the catalog is invalidated (e.g. by !editmap)
+alias_table = None
+
+
+class AliasTable:
+    """
+    Walker/Vose alias table for drawing from a fixed weighted distribution in constant time.
+    """
+    def __init__(self, items, weights):
+        self.version = None
+        self.items = list(items)
+        self.weights = [float(weight) for weight in weights]
+        n = len(self.items)
+        total = sum(self.weights)
+        self.prob = [0.0] * n
+        self.alias = list(range(n))
+        if n == 0 or total <= 0:
+            return
+
+        scaled = [weight * n / total for weight in self.weights]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            (small if scaled[l] < 1.0 else large).append(l)
+
+        # Whatever is left is 1 up to floating point error
+        for i in small + large:
+            self.prob[i] = 1.0
+
+    def __len__(self):
+        return len(self.items)
+
+    def draw(self, rng):
+        """Returns the index of one weighted draw."""
+        i = int(rng.random() * len(self.items))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+
+
+def get_alias_table():
+    global alias_table
+    version = get_catalog_version()
+    if alias_table is None or alias_table.version != version:
+        map_weights = get_map_weights()
+        alias_table = AliasTable(map_weights.keys(), map_weights.values())
+        alias_table.version = version
+    return alias_table
+
+
+def get_recency_multipliers(table, recent_maps, recency_decay):
+    """
+    Weight multiplier for each map: recency_decay[i] applies to the i-th most recent map, anything else keeps 1.
+    """
+    multipliers = [1.0] * len(table)
+    index_by_name = {normalize_map_name(name): i for i, name in enumerate(table.items)}
+    for position, map_name in enumerate(recent_maps[:len(recency_decay)]):
+        i = index_by_name.get(normalize_map_name(map_name))
+        if i is not None:
+            multipliers[i] = min(multipliers[i], recency_decay[position])
+    return multipliers
+
+
+def sample_maps(k, recent_maps=(), recency_decay=(), rng=random):
+    """
+    Draw k distinct maps, with each recent map's weight scaled by its recency decay.
+
+    Draws come from the precomputed alias table and are accepted with probability equal to the map's
+    multiplier, which gives exactly weight * multiplier sampling. After MAX_ALIAS_ATTEMPTS rejections
+    the draw falls back to an exact weighted choice over the remaining maps, so the cost stays bounded.
+
+    :param k: Number of maps to draw.
+    :param recent_maps: Recently played map names, most recent first.
+    :param recency_decay: Multipliers for the most recent, second most recent, ... maps.
+    :param rng: Random source, pass a seeded random.Random for reproducible draws.
+    :return: List of k map names (fewer if there aren't enough maps).
+    """
+    table = get_alias_table()
+    multipliers = get_recency_multipliers(table, list(recent_maps), list(recency_decay))
+
+    # If the decay rules out every map that is left, ignore it rather than picking nothing
+    if sum(1 for m in multipliers if m > 0) < k:
+        multipliers = [1.0] * len(table)
+
+    selected = []
+    for _ in range(min(k, len(table))):
+        index = None
+        for _ in range(MAX_ALIAS_ATTEMPTS):
+            candidate = table.draw(rng)
+            if multipliers[candidate] > 0 and rng.random() < multipliers[candidate]:
+                index = candidate
+                break
+
+        if index is None:
+            adjusted = [weight * multiplier for weight, multiplier in zip(table.weights, multipliers)]
+            if sum(adjusted) <= 0:
+                break
+            index = rng.choices(range(len(table)), adjusted, k=1)[0]
+
+        selected.append(table.items[index])
+        multipliers[index] = 0.0  # Sample without replacement
+
+    return selected
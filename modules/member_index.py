@@ -0,0 +1,188 @@
+from bisect import bisect_left, insort
+
+from data.player_mappings import player_name_mapping
+from modules.name_matcher import NameMatcher
+from modules.player_registry import add_registry_listener, get_player_aliases, load_player_registry
+
+# Guild id -> MemberNameIndex, built on first lookup and kept current by the member/user events in pug_balance_bot.py
+member_indexes = {}
+
+
+class MemberNameIndex:
+    """
+    Name lookups for the members of one guild.
+
+    Exact usernames and display names map to member ids in insertion order, casefolded names allow
+    case-insensitive lookups, and a sorted list of the casefolded names answers prefix queries with bisect.
+    The matcher holds every username, display name, player_name_mapping name and registry alias, for finding names in free text.
+    """
+    def __init__(self, members=(), player_names=None, player_aliases=()):
+        self.names_by_id = {}   # member id -> (username, display name)
+        self.by_name = {}       # username -> [member ids]
+        self.by_display = {}    # display name -> [member ids]
+        self.by_folded = {}     # casefolded username or display name -> [member ids]
+        self.sorted_folded = []
+        self.aliases = {}       # player_name_mapping name or registry alias -> player id
+        self.matcher = NameMatcher()
+        for member in members:
+            self.add(member.id, member.name, member.display_name)
+        for player_id, name in (player_names or {}).items():
+            self.set_alias(player_id, None, name)
+        for player_id, alias in player_aliases:
+            self.set_alias(player_id, None, alias)
+
+    def __len__(self):
+        return len(self.names_by_id)
+
+    def __contains__(self, member_id):
+        return member_id in self.names_by_id
+
+    @staticmethod
+    def _insert(lookup, key, member_id):
+        ids = lookup.setdefault(key, [])
+        if member_id not in ids:
+            ids.append(member_id)
+
+    @staticmethod
+    def _delete(lookup, key, member_id):
+        ids = lookup.get(key)
+        if ids and member_id in ids:
+            ids.remove(member_id)
+            if not ids:
+                del lookup[key]
+                return True
+        return False
+
+    def add(self, member_id, name, display_name):
+        """Index a member, replacing whatever was indexed for them before."""
+        if self.names_by_id.get(member_id) == (name, display_name):
+            return
+        self.remove(member_id)
+        self.names_by_id[member_id] = (name, display_name)
+        self.matcher.add(name)
+        self.matcher.add(display_name)
+        self._insert(self.by_name, name, member_id)
+        self._insert(self.by_display, display_name, member_id)
+        for folded in {name.casefold(), display_name.casefold()}:
+            if folded not in self.by_folded:
+                insort(self.sorted_folded, folded)
+            self._insert(self.by_folded, folded, member_id)
+
+    def remove(self, member_id):
+        names = self.names_by_id.pop(member_id, None)
+        if names is None:
+            return
+        name, display_name = names
+        self.matcher.remove(name)
+        self.matcher.remove(display_name)
+        self._delete(self.by_name, name, member_id)
+        self._delete(self.by_display, display_name, member_id)
+        for folded in {name.casefold(), display_name.casefold()}:
+            if self._delete(self.by_folded, folded, member_id):
+                position = bisect_left(self.sorted_folded, folded)
+                if position < len(self.sorted_folded) and self.sorted_folded[position] == folded:
+                    del self.sorted_folded[position]
+
+    def get_id(self, name):
+        """
+        Same precedence as discord.utils.get over the member list: a username match first, then a display name match.
+        """
+        ids = self.by_name.get(name) or self.by_display.get(name)
+        return ids[0] if ids else None
+
+    def get_ids_casefold(self, name):
+        return list(self.by_folded.get(name.casefold(), ()))
+
+    def get_ids_by_prefix(self, prefix, limit=None):
+        """Returns the ids of members whose username or display name starts with prefix (case-insensitive)."""
+        prefix = prefix.casefold()
+        ids = []
+        position = bisect_left(self.sorted_folded, prefix)
+        while position < len(self.sorted_folded) and self.sorted_folded[position].startswith(prefix):
+            for member_id in self.by_folded[self.sorted_folded[position]]:
+                if member_id not in ids:
+                    ids.append(member_id)
+            if limit is not None and len(ids) >= limit:
+                return ids[:limit]
+            position += 1
+        return ids
+
+    def set_alias(self, player_id, old_name, new_name):
+        """Track a player_name_mapping name or registry alias, so the matcher can find players by it."""
+        if old_name is not None and self.aliases.get(old_name) == player_id:
+            del self.aliases[old_name]
+            self.matcher.remove(old_name)
+        if new_name:
+            if new_name not in self.aliases:
+                self.matcher.add(new_name)
+            self.aliases[new_name] = player_id
+
+    def resolve(self, name):
+        """Returns the id for a name found by the matcher: a member's username or display name, then a mapped name."""
+        return self.get_id(name) or self.aliases.get(name)
+
+    def find_names(self, text):
+        """
+        Finds known names in text in one pass, preferring the leftmost and then the longest name,
+        without overlaps. Returns (start, end, name, id) tuples in text order.
+        """
+        return [(start, end, name, self.resolve(name)) for start, end, name in self.matcher.find(text)]
+
+
+def get_member_index(guild):
+    """Returns the name index for a guild, building it from the member cache on first use."""
+    index = member_indexes.get(guild.id)
+    if index is None:
+        load_player_registry()
+        index = member_indexes[guild.id] = MemberNameIndex(guild.members, player_name_mapping, get_player_aliases())
+    return index
+
+
+def update_member(member):
+    """Re-index a member after a join, nickname change or username change."""
+    index = member_indexes.get(member.guild.id)
+    if index is not None:
+        index.add(member.id, member.name, member.display_name)
+
+
+def remove_member(member):
+    index = member_indexes.get(member.guild.id)
+    if index is not None:
+        index.remove(member.id)
+
+
+def rename_player(player_id, old_name, new_name):
+    """Update every guild's matcher after a player_name_mapping change, e.g. from !setname."""
+    for index in member_indexes.values():
+        index.set_alias(player_id, old_name, new_name)
+
+
+def on_player_updated(player_id, old_record, record):
+    old_record = old_record or {"name": None, "aliases": []}
+    if old_record["name"] != record["name"]:
+        rename_player(player_id, old_record["name"], record["name"])
+    for alias in set(old_record["aliases"]) - set(record["aliases"]):
+        rename_player(player_id, alias, None)
+    for alias in set(record["aliases"]) - set(old_record["aliases"]):
+        rename_player(player_id, None, alias)
+
+
+add_registry_listener(on_player_updated)
+
+
+def get_user_id_by_name(guild, username):
+    """
+    Retrieves the user ID based on the provided username or display name.
+    Falls back to a case-insensitive match when it identifies exactly one member.
+
+    :param guild: Discord guild object.
+    :param username: The name or display name of the user.
+    :return: User ID if found, else None.
+    """
+    index = get_member_index(guild)
+    user_id = index.get_id(username)
+    if user_id is None:
+        ids = index.get_ids_casefold(username)
+        if len(ids) == 1:
+            user_id = ids[0]
+    return user_id
@@ -0,0 +1,117 @@
+from collections import deque
+
+
+class NameMatcher:
+    """
+    Aho-Corasick automaton for finding many names in a piece of text in a single pass.
+
+    Names can be added and removed at any time: the trie is updated in place and the failure links
+    are recomputed on the next search. Each name is reference counted, so a name shared by several
+    members stays matchable until the last of them is removed.
+    """
+    def __init__(self, names=()):
+        self.goto = [{}]        # node -> {character: child node}
+        self.fail = [0]         # node -> longest proper suffix that is also a trie node
+        self.output = [0]       # node -> next node on the suffix chain that ends a name
+        self.names = [None]     # node -> the name ending at this node, if it is currently added
+        self.counts = {}        # name -> number of times it was added
+        self.dirty = False
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, name):
+        return name in self.counts
+
+    def add(self, name):
+        if not name:
+            return
+        if name in self.counts:
+            self.counts[name] += 1
+            return
+        self.counts[name] = 1
+
+        node = 0
+        for character in name:
+            child = self.goto[node].get(character)
+            if child is None:
+                child = len(self.goto)
+                self.goto[node][character] = child
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append(0)
+                self.names.append(None)
+            node = child
+        self.names[node] = name
+        self.dirty = True
+
+    def remove(self, name):
+        count = self.counts.get(name)
+        if count is None:
+            return
+        if count > 1:
+            self.counts[name] = count - 1
+            return
+        del self.counts[name]
+
+        # The trie nodes are left in place, only the name stops being reported
+        node = 0
+        for character in name:
+            node = self.goto[node][character]
+        self.names[node] = None
+        self.dirty = True
+
+    def build(self):
+        """Recompute the failure and output links with a breadth first walk of the trie."""
+        queue = deque()
+        for child in self.goto[0].values():
+            self.fail[child] = 0
+            self.output[child] = 0
+            queue.append(child)
+
+        while queue:
+            node = queue.popleft()
+            for character, child in self.goto[node].items():
+                state = self.fail[node]
+                while state and character not in self.goto[state]:
+                    state = self.fail[state]
+                self.fail[child] = self.goto[state].get(character, 0)
+                self.output[child] = self.fail[child] if self.names[self.fail[child]] else self.output[self.fail[child]]
+                queue.append(child)
+
+        self.dirty = False
+
+    def find_all(self, text):
+        """Returns (start, end, name) for every occurrence of every name, overlapping ones included."""
+        if self.dirty:
+            self.build()
+
+        matches = []
+        state = 0
+        for position, character in enumerate(text):
+            while state and character not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(character, 0)
+
+            node = state if self.names[state] else self.output[state]
+            while node:
+                name = self.names[node]
+                matches.append((position + 1 - len(name), position + 1, name))
+                node = self.output[node]
+        return matches
+
+    def find(self, text):
+        """
+        Returns the leftmost-longest, non-overlapping matches as (start, end, name), in text order.
+        At each position the longest name wins, and the search resumes after it.
+        """
+        matches = sorted(self.find_all(text), key=lambda match: (match[0], -match[1]))
+        selected = []
+        last_end = 0
+        for start, end, name in matches:
+            if start >= last_end:
+                selected.append((start, end, name))
+                last_end = end
+        return selected
@@ -0,0 +1,98 @@
+import asyncio
+import time
+
+import discord
+
+# Maximum number of DMs in flight at once
+DM_CONCURRENCY = 4
+
+# How many times a single DM is retried after being rate limited
+DM_MAX_RETRIES = 3
+
+
+class RouteLimiter:
+    """
+    Tracks when each REST route may be used again after a 429, so that concurrent
+    senders back off together instead of all hammering the same bucket.
+    """
+    def __init__(self):
+        self.blocked_until = {}
+
+    async def wait(self, route):
+        delay = self.blocked_until.get(route, 0) - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def block(self, route, retry_after):
+        until = time.monotonic() + retry_after
+        if until > self.blocked_until.get(route, 0):
+            self.blocked_until[route] = until
+
+
+def get_retry_after(error, default=1.0):
+    """Reads the retry delay (in seconds) from a rate limited HTTPException."""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None) or {}
+    try:
+        return float(headers.get('Retry-After', default))
+    except (TypeError, ValueError):
+        return default
+
+
+async def send_dm(bot, user_id, embed, limiter):
+    """
+    Sends a single DM, waiting out any rate limit on the DM channel creation route and
+    on the DM channel's own message route. Returns None on success, or the failure reason.
+    """
+    user = bot.get_user(user_id)
+    if not user:
+        return "User not found"
+
+    for _ in range(DM_MAX_RETRIES + 1):
+        route = 'create_dm'
+        try:
+            # Opening a DM channel is one shared route; sending a message is a route per DM channel.
+            channel = user.dm_channel
+            if channel is None:
+                await limiter.wait(route)
+                channel = await user.create_dm()
+
+            route = ('send_message', channel.id)
+            await limiter.wait(route)
+            await channel.send(embed=embed)
+            return None
+        except discord.Forbidden:
+            return "DMs are closed"
+        except discord.HTTPException as e:
+            if e.status != 429:
+                return f"HTTP {e.status}: {e.text}"
+            limiter.block(route, get_retry_after(e))
+
+    return "Rate limited"
+
+
+async def dispatch_dms(bot, messages, max_concurrency=DM_CONCURRENCY):
+    """
+    Sends DMs concurrently with bounded parallelism.
+
+    :param bot: Discord bot instance.
+    :param messages: List of (user_id, name, embed) tuples.
+    :param max_concurrency: Maximum number of DMs in flight at once.
+    :return: Dictionary of user_id to (name, reason) for every DM that could not be delivered.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    limiter = RouteLimiter()
+    failures = {}
+
+    async def deliver(user_id, name, embed):
+        async with semaphore:
+            try:
+                reason = await send_dm(bot, user_id, embed, limiter)
+            except Exception as e:
+                reason = str(e)
+        if reason:
+            failures[user_id] = (name, reason)
+            print(f"Failed to send DM to {name}. Error: {reason}")
+
+    await asyncio.gather(*(deliver(user_id, name, embed) for user_id, name, embed in messages))
+    return failures
@@ -0,0 +1,134 @@
+import os
+from bisect import bisect_right
+
+from PIL import Image, ImageDraw, ImageFont
+
+FONT_PATH = "arial.ttf"  # Using Arial font, you might need to adjust the path
+
+# Layout of the players image
+COLUMNS = 3
+FONT_SIZE = 24  # Approximate font size for Discord
+SPACING = 5  # Space between each line
+MARGIN = 10  # Margin for the image
+WIDTH_PER_COLUMN = 450  # Width allocation for each column
+NAME_WIDTH = 150  # Set a fixed width for player names
+VALUE_SPACING = 5  # Spacing between the name and the value
+
+# Loaded fonts by (path, size)
+fonts = {}
+
+# Glyph caches by (path, size)
+glyph_caches = {}
+
+# Blank canvases by size, copied for every image
+base_canvases = {}
+
+
+def get_font(size=FONT_SIZE, path=FONT_PATH):
+    key = (path, size)
+    if key not in fonts:
+        fonts[key] = ImageFont.truetype(path, size)
+    return fonts[key]
+
+
+class GlyphCache:
+    """
+    Rendered masks and advance widths of a font's characters, each measured and rendered once.
+    Text is laid out from the cached advances (without kerning), so measuring a name is a sum
+    and drawing it is one paste per character, with no calls into the font.
+    """
+    def __init__(self, font):
+        self.font = font
+        self.glyphs = {}
+        self.widths = {}
+
+    def get_glyph(self, char):
+        """Returns (mask or None for blank glyphs, x offset, y offset, advance width)."""
+        glyph = self.glyphs.get(char)
+        if glyph is None:
+            x0, y0, x1, y1 = self.font.getbbox(char)
+            mask = None
+            if x1 > x0 and y1 > y0:
+                mask = Image.new("L", (x1 - x0, y1 - y0), 0)
+                ImageDraw.Draw(mask).text((-x0, -y0), char, fill=255, font=self.font)
+            glyph = self.glyphs[char] = (mask, x0, y0, self.font.getlength(char))
+        return glyph
+
+    def get_prefix_widths(self, text):
+        """widths[i] is the width of text[:i]."""
+        widths = [0]
+        for char in text:
+            widths.append(widths[-1] + self.get_glyph(char)[3])
+        return widths
+
+    def get_text_width(self, text):
+        width = self.widths.get(text)
+        if width is None:
+            width = self.widths[text] = self.get_prefix_widths(text)[-1]
+        return width
+
+    def truncate_text(self, text, max_width):
+        """The longest prefix of text that fits in max_width pixels, found with a binary search over the prefix widths."""
+        if self.get_text_width(text) <= max_width:
+            return text
+        return text[:bisect_right(self.get_prefix_widths(text), max_width) - 1]
+
+    def draw_text(self, img, xy, text, fill):
+        x, y = xy
+        for char in text:
+            mask, x_offset, y_offset, advance = self.get_glyph(char)
+            if mask is not None:
+                left, top = int(round(x)) + x_offset, y + y_offset
+                img.paste(fill, (left, top, left + mask.width, top + mask.height), mask)
+            x += advance
+
+
+def get_glyph_cache(size=FONT_SIZE, path=FONT_PATH):
+    key = (path, size)
+    if key not in glyph_caches:
+        glyph_caches[key] = GlyphCache(get_font(size, path))
+    return glyph_caches[key]
+
+
+def get_canvas(size):
+    if size not in base_canvases:
+        base_canvases[size] = Image.new("RGBA", size, (255, 255, 255, 0))
+    return base_canvases[size].copy()
+
+
+def render_players_image(rows, path):
+    """
+    Draw (name, value) rows on a transparent image, split over COLUMNS columns, and save it.
+    :param rows: (name, value text) for each player, in the order they are listed.
+    :param path: Where the PNG is saved.
+    :return: The path.
+    """
+    total_width = WIDTH_PER_COLUMN * COLUMNS + 2 * MARGIN
+    height = (FONT_SIZE + SPACING) * len(rows) // COLUMNS + 2 * MARGIN + 10
+    img = get_canvas((total_width, height))
+    glyphs = get_glyph_cache()
+
+    # Calculate the number of players in each column
+    base_players_per_column = len(rows) // COLUMNS
+    remainder_players = len(rows) % COLUMNS
+    players_in_columns = [base_players_per_column + (1 if i < remainder_players else 0) for i in range(COLUMNS)]
+
+    current_column = 0
+    players_in_current_column = 0
+    for name, value in rows:
+        x_name = MARGIN + current_column * WIDTH_PER_COLUMN
+        y = MARGIN + players_in_current_column * (FONT_SIZE + SPACING)
+        glyphs.draw_text(img, (x_name, y), glyphs.truncate_text(name, NAME_WIDTH), "white")
+        glyphs.draw_text(img, (x_name + NAME_WIDTH + VALUE_SPACING, y), value, "white")
+
+        # Update counters for column distribution
+        players_in_current_column += 1
+        if players_in_current_column >= players_in_columns[current_column]:
+            current_column += 1
+            players_in_current_column = 0
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    img.save(path, compress_level=1)  # Mostly transparent, so fast compression costs little in size
+    return path
@@ -0,0 +1,176 @@
+import os
+import json
+
+from data.player_mappings import player_name_mapping
+from data.capper_data import capper_value_mapping
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+REGISTRY_FILE = os.path.join(BASE_DIR, 'data', 'player_registry.jsonl')
+
+# Rewrite the journal once it holds this many superseded records
+COMPACT_THRESHOLD = 200
+
+# Player id -> {"name", "capper_value", "aliases"}, loaded once from the journal
+players = {}
+superseded_records = 0
+registry_loaded = False
+
+# Called with (player_id, old_record, new_record) after every update
+listeners = []
+
+
+def empty_record():
+    return {"name": None, "capper_value": None, "aliases": []}
+
+
+def add_registry_listener(callback):
+    """Register a callback(player_id, old_record, new_record) that is called after every registry update."""
+    listeners.append(callback)
+
+
+def sync_mappings():
+    """
+    Refill player_name_mapping and capper_value_mapping from the registry. The dicts are updated in place,
+    so every module that imported them sees the registry's values.
+    """
+    player_name_mapping.clear()
+    capper_value_mapping.clear()
+    for player_id, record in players.items():
+        if record["name"] is not None:
+            player_name_mapping[player_id] = record["name"]
+        if record["capper_value"] is not None:
+            capper_value_mapping[player_id] = record["capper_value"]
+
+
+def write_registry(filepath, records):
+    temp_file = filepath + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        for player_id, record in records.items():
+            f.write(json.dumps({"id": player_id, **record}, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, filepath)
+
+
+def load_player_registry():
+    """
+    Load the registry journal (only once per session). Each line is a complete player record and the last
+    line for a player wins. Without a journal, the registry is seeded from data/player_mappings.py and
+    data/capper_data.py.
+    """
+    global registry_loaded, superseded_records
+    if registry_loaded:
+        return
+    registry_loaded = True
+
+    if not os.path.exists(REGISTRY_FILE):
+        for player_id, name in player_name_mapping.items():
+            players.setdefault(player_id, empty_record())["name"] = name
+        for player_id, value in capper_value_mapping.items():
+            players.setdefault(player_id, empty_record())["capper_value"] = value
+        write_registry(REGISTRY_FILE, players)
+        print(f"Created the player registry with {len(players)} players.")
+        return
+
+    lines = 0
+    interrupted = False
+    with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.endswith("\n"):
+                interrupted = True
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # Only an interrupted append can leave a partial line, and that update never completed
+                print("Skipping a malformed line in the player registry.")
+                interrupted = True
+                continue
+            lines += 1
+            player_id = int(entry.pop("id"))
+            record = empty_record()
+            record.update(entry)
+            players[player_id] = record
+
+    superseded_records = lines - len(players)
+    sync_mappings()
+    if interrupted:
+        # Appending after an unterminated line would merge the next record into it, so rewrite the journal first
+        compact_player_registry()
+
+
+def compact_player_registry():
+    """Rewrite the journal with one line per player."""
+    global superseded_records
+    write_registry(REGISTRY_FILE, players)
+    superseded_records = 0
+
+
+def get_player_record(player_id):
+    load_player_registry()
+    record = players.get(player_id)
+    return dict(record) if record else None
+
+
+def update_player(player_id, **changes):
+    """
+    Update one player's record. The new record is appended to the journal as a single line and flushed
+    before the in-memory mappings change, then every listener is notified.
+
+    :param player_id: Discord id of the player.
+    :param changes: Any of name, capper_value (None removes it) and aliases.
+    :return: The updated record.
+    """
+    global superseded_records
+    load_player_registry()
+    unknown = set(changes) - set(empty_record())
+    if unknown:
+        raise ValueError(f"Unknown player registry fields: {', '.join(sorted(unknown))}")
+
+    old_record = players.get(player_id)
+    record = dict(old_record) if old_record else empty_record()
+    record.update(changes)
+
+    with open(REGISTRY_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({"id": player_id, **record}, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    players[player_id] = record
+    if old_record is not None:
+        superseded_records += 1
+    sync_player(player_id, record)
+
+    for callback in listeners:
+        callback(player_id, old_record, record)
+
+    if superseded_records >= COMPACT_THRESHOLD:
+        compact_player_registry()
+    return record
+
+
+def sync_player(player_id, record):
+    """Apply one record to player_name_mapping and capper_value_mapping."""
+    if record["name"] is not None:
+        player_name_mapping[player_id] = record["name"]
+    else:
+        player_name_mapping.pop(player_id, None)
+    if record["capper_value"] is not None:
+        capper_value_mapping[player_id] = record["capper_value"]
+    else:
+        capper_value_mapping.pop(player_id, None)
+
+
+def set_player_name(player_id, name):
+    return update_player(player_id, name=name)
+
+
+def set_capper_value(player_id, value):
+    return update_player(player_id, capper_value=value)
+
+
+def get_player_aliases():
+    """Returns (player_id, alias) for every alias in the registry."""
+    load_player_registry()
+    return [(player_id, alias) for player_id, record in players.items() for alias in record["aliases"]]
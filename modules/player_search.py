@@ -0,0 +1,162 @@
+from collections import Counter, namedtuple
+
+from data.player_mappings import player_name_mapping
+from modules.player_registry import add_registry_listener, load_player_registry
+
+# Match kinds, best first
+EXACT, CASEFOLD, SUBSTRING, FUZZY = range(4)
+
+# Number of trigram candidates that are scored with edit distance when nothing matches as a substring
+MAX_FUZZY_CANDIDATES = 50
+
+SearchResult = namedtuple('SearchResult', ['id', 'name', 'kind', 'score'])
+
+# Built from player_name_mapping on first search and dropped whenever the player registry changes
+search_index = None
+
+
+def get_trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def get_max_distance(query):
+    """Number of typos tolerated for a query of this length."""
+    if len(query) <= 4:
+        return 1
+    if len(query) <= 8:
+        return 2
+    return 3
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions).
+    Returns max_distance + 1 as soon as the distance is known to exceed max_distance.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class PlayerSearchIndex:
+    """
+    Search index over the player_name_mapping names.
+
+    Exact and casefolded names are dictionary lookups. Substring and typo tolerant searches use a posting
+    list of the ids with each trigram, so only names sharing trigrams with the query are ever compared.
+    """
+    def __init__(self, player_names):
+        self.names = dict(player_names)  # player id -> name
+        self.folded = {player_id: name.casefold() for player_id, name in self.names.items()}
+        self.by_name = {}
+        self.by_folded = {}
+        self.postings = {}
+        for player_id, name in self.names.items():
+            self.by_name[name] = player_id
+            self.by_folded.setdefault(self.folded[player_id], []).append(player_id)
+            for trigram in get_trigrams(self.folded[player_id]):
+                self.postings.setdefault(trigram, []).append(player_id)
+
+    def get_candidates(self, folded_query):
+        """Ids of names sharing at least one trigram with the query, most shared trigrams first."""
+        counts = Counter()
+        for trigram in get_trigrams(folded_query):
+            counts.update(self.postings.get(trigram, ()))
+        return [player_id for player_id, _ in counts.most_common()]
+
+    def get_substring_matches(self, folded_query):
+        if len(folded_query) < 3:
+            # Too short to have a trigram of its own, but short queries only need a quick scan
+            player_ids = self.names.keys()
+        else:
+            # Every inner trigram of the query must occur in a name that contains it
+            inner = [folded_query[i:i + 3] for i in range(len(folded_query) - 2)]
+            postings = sorted((self.postings.get(trigram, ()) for trigram in inner), key=len)
+            player_ids = set(postings[0]).intersection(*postings[1:])
+        return [player_id for player_id in player_ids if folded_query in self.folded[player_id]]
+
+    def search(self, query, limit=5, fuzzy=True):
+        """
+        Returns up to limit SearchResults for a name, best first.
+
+        An exact name wins outright, then a case-insensitive exact name. Otherwise names containing the query
+        are ranked by how close their length is to the query's. If no name contains it, names within a few
+        typos of the query (or of the start of the name) are ranked by edit distance, unless fuzzy is False.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        if query in self.by_name:
+            player_id = self.by_name[query]
+            return [SearchResult(player_id, self.names[player_id], EXACT, 0)]
+
+        folded_query = query.casefold()
+        if folded_query in self.by_folded:
+            return [SearchResult(player_id, self.names[player_id], CASEFOLD, 0) for player_id in self.by_folded[folded_query]][:limit]
+
+        results = [SearchResult(player_id, self.names[player_id], SUBSTRING, len(self.folded[player_id]) - len(folded_query))
+                   for player_id in self.get_substring_matches(folded_query)]
+
+        if not results and fuzzy:
+            max_distance = get_max_distance(folded_query)
+            for player_id in self.get_candidates(folded_query)[:MAX_FUZZY_CANDIDATES]:
+                name = self.folded[player_id]
+                distance = min(edit_distance(folded_query, name, max_distance),
+                               edit_distance(folded_query, name[:len(folded_query)], max_distance))
+                if distance <= max_distance:
+                    results.append(SearchResult(player_id, self.names[player_id], FUZZY, distance))
+
+        results.sort(key=lambda result: (result.score, len(result.name), result.name))
+        return results[:limit]
+
+
+def get_search_index():
+    global search_index
+    if search_index is None:
+        load_player_registry()
+        search_index = PlayerSearchIndex(player_name_mapping)
+    return search_index
+
+
+def invalidate_player_search(*_):
+    global search_index
+    search_index = None
+
+
+add_registry_listener(invalidate_player_search)
+
+
+def search_players(query, limit=5, fuzzy=True):
+    return get_search_index().search(query, limit, fuzzy)
+
+
+def find_player(query, fuzzy=True):
+    """
+    Resolves a name to a single player.
+
+    :param query: Name, partial name or misspelled name of a player.
+    :param fuzzy: Whether misspelled names are matched when no name contains the query.
+    :return: (player_id, candidates). player_id is None when nothing matches, or when several names match
+             equally well, in which case candidates lists the tied names.
+    """
+    results = search_players(query, fuzzy=fuzzy)
+    if not results:
+        return None, []
+    best = results[0]
+    tied = [result for result in results if result.kind == best.kind and result.score == best.score]
+    if len(tied) == 1 or best.kind == EXACT:
+        return best.id, []
+    return None, [result.name for result in tied]
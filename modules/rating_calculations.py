@@ -3,6 +3,13 @@ import math
 import trueskill
 from math import erf, sqrt
 from scipy.special import logit
+from modules.rating_replay import MatchTable, PlayerRatingHistory, replay_ratings
+
+# Scale of the pick order bonus to starting ratings, for the first five picks and for later picks
+EARLY_PICK_BONUS_SCALE = 2
+LATE_PICK_BONUS_SCALE = 20
+# TrueSkill dynamics factor, how much ratings can move between games
+RATING_TAU = 0.08333333333333
 
 def win_probability(team1, team2):
     delta_mu = sum(r.mu for r in team1) - sum(r.mu for r in team2)
@@ -28,9 +35,9 @@ def compute_logit_bonus(pick_order, total_picks=12, delta=0.015):
     logit_value = logit(normalized_order * (1 - (2 * delta)) + delta)
     
     if pick_order < 6:
-        bonus = 2 * logit_value / abs(logit(delta))
+        bonus = EARLY_PICK_BONUS_SCALE * logit_value / abs(logit(delta))
     else:
-        bonus = 20 * logit_value / abs(logit(delta))
+        bonus = LATE_PICK_BONUS_SCALE * logit_value / abs(logit(delta))
     
     return bonus
 
@@ -40,33 +47,74 @@ def calculate_draw_rate(game_data):
     draw_matches = sum(1 for game in game_data if game['winningTeam'] == 0)
     return draw_matches / total_matches if total_matches > 0 else 0
 
-def initialize_player_data(game_data):
-    player_ids = set(player['user']['id'] for match in game_data for player in match['players'])
-    player_data = {
-        'picks': {player_id: [] for player_id in player_ids},
-        'wins': {player_id: 0 for player_id in player_ids},
-        'names': {player['user']['id']: player['user']['name'] for match in game_data for player in match['players']},
-        'games': {player_id: 0 for player_id in player_ids},
-        'rating_history': {player_id: [] for player_id in player_ids}
-    }
-    return player_data
-
-def process_matches(game_data, player_data):
-    for match in game_data:
-        team1_size = sum(1 for player in match['players'] if player['team'] == 1)
-        team2_size = sum(1 for player in match['players'] if player['team'] == 2)
+def aggregate_player_data(game_data):
+    """
+    Collect everything the ratings need in a single pass over the games.
+
+    Games, wins and picks only count matches with teams of the same size. Matches whose teams are also
+    non-empty go into a MatchTable for the rating replay, with the winners first (a draw counts as a
+    team 1 win).
+
+    :param game_data: The games, oldest first.
+    :return: Dict with 'ids' (player ids in order of first appearance), 'index' (player id -> position in 'ids'),
+             'names', 'games', 'wins' and 'picks' by player id, 'balanced' (whether each game's teams are the same
+             size) and 'matches' (the MatchTable).
+    """
+    ids, index, names, games, wins, picks = [], {}, {}, {}, {}, {}
+    balanced, winners, losers, offsets, match_indexes = [], [], [], [0], []
+
+    for match_index, match in enumerate(game_data):
+        winning_team = match['winningTeam']
+        team1, team2 = [], []
+        for player in match['players']:
+            user = player['user']
+            player_id = user['id']
+            player_index = index.get(player_id)
+            if player_index is None:
+                player_index = index[player_id] = len(ids)
+                ids.append(player_id)
+                games[player_id] = 0
+                wins[player_id] = 0
+                picks[player_id] = []
+            names[player_id] = user['name']
+
+            team = player['team']
+            if team == 1:
+                team1.append(player_index)
+            elif team == 2:
+                team2.append(player_index)
 
         # If teams are imbalanced, skip processing this match
-        if team1_size != team2_size:
+        balanced.append(len(team1) == len(team2))
+        if not balanced[-1]:
             continue
-        
+
         for player in match['players']:
             player_id = player['user']['id']
-            player_data['games'][player_id] += 1
+            games[player_id] += 1
             if player['pickOrder']:
-                player_data['picks'][player_id].append(player['pickOrder'])
-            if match['winningTeam'] == player['team']:
-                player_data['wins'][player_id] += 1
+                picks[player_id].append(player['pickOrder'])
+            if winning_team == player['team']:
+                wins[player_id] += 1
+
+        if team1:
+            if winning_team == 2:
+                team1, team2 = team2, team1
+            winners.extend(team1)
+            losers.extend(team2)
+            offsets.append(len(winners))
+            match_indexes.append(match_index)
+
+    return {
+        'ids': ids,
+        'index': index,
+        'names': names,
+        'games': games,
+        'wins': wins,
+        'picks': picks,
+        'balanced': balanced,
+        'matches': MatchTable(winners, losers, offsets, match_indexes)
+    }
 
 def compute_avg_picks(player_picks):
     def recent_games_count(total_games):
@@ -100,49 +148,46 @@ def adjust_ratings_based_on_pick_order(ts, player_ratings, player_games, avg_pic
 
 
 
-def process_rating_adjustment(ts, game_data, player_ratings, player_data):
-    for match in game_data:
-        team1_size = sum(1 for player in match['players'] if player['team'] == 1)
-        team2_size = sum(1 for player in match['players'] if player['team'] == 2)
+def process_rating_adjustment(ts, player_data, player_ratings, with_history=False):
+    player_ids = player_data['ids']
+    mu = [player_ratings[player_id].mu for player_id in player_ids]
+    sigma = [player_ratings[player_id].sigma for player_id in player_ids]
 
-        # If teams are imbalanced, skip processing this match
-        if team1_size != team2_size:
-            continue
-        
-        teams, team_player_ids = [], []
-        for team_number in [1, 2]:
-            team = [player_ratings[player['user']['id']] for player in match['players'] if player['team'] == team_number]
-            player_ids = [player['user']['id'] for player in match['players'] if player['team'] == team_number]
-            teams.append(team)
-            team_player_ids.append(player_ids)
-
-        if match['winningTeam'] == 2:
-            teams.reverse()
-            team_player_ids.reverse()
-
-        try:
-            new_ratings = ts.rate(teams)
-        except FloatingPointError:
-            continue
-        
-        for i, team in enumerate(teams):
-            for j, player_rating in enumerate(team):
-                player_id = team_player_ids[i][j]
-                player_ratings[player_id] = new_ratings[i][j]
-                rating_dict = {"mu": new_ratings[i][j].mu, "sigma": new_ratings[i][j].sigma}
-                player_data['rating_history'][player_id].append(rating_dict)
-
-def calculate_ratings(game_data, queue='NA'):
+    history = replay_ratings(player_data['matches'], mu, sigma, ts, record_history=with_history)
+
+    for index, player_id in enumerate(player_ids):
+        player_ratings[player_id] = trueskill.Rating(mu=mu[index], sigma=sigma[index])
+    return PlayerRatingHistory(history, player_ids) if with_history else None
+
+def prepare_ratings(game_data, queue='NA', player_data=None):
+    """
+    Everything a rating replay starts from.
+    :param player_data: aggregate_player_data(game_data), if it has already been computed.
+    :return: (TrueSkill environment, player data from aggregate_player_data, starting ratings by player id
+             adjusted for pick order).
+    """
     draw_rate = calculate_draw_rate(game_data)
-    custom_tau = 0.08333333333333
+    custom_tau = RATING_TAU
     ts = trueskill.TrueSkill(draw_probability=draw_rate, tau=custom_tau) if queue != 'NA' else trueskill.TrueSkill(tau=custom_tau)
 
-    player_data = initialize_player_data(game_data)
-    process_matches(game_data, player_data)
+    if player_data is None:
+        player_data = aggregate_player_data(game_data)
     avg_picks = compute_avg_picks(player_data['picks'])
     
     player_ratings = {player_id: trueskill.Rating(mu=9, sigma=8.33) for player_id in player_data['games'].keys()}
     adjust_ratings_based_on_pick_order(ts, player_ratings, player_data['games'], avg_picks, queue, player_data['names'])
-    process_rating_adjustment(ts, game_data, player_ratings, player_data)
-
-    return player_ratings, player_data['names'], player_data['games'], player_data['rating_history']
+    return ts, player_data, player_ratings
+
+def calculate_ratings(game_data, queue='NA', with_history=False):
+    """
+    Replay every game to get the current TrueSkill ratings.
+    :param game_data: The games, oldest first.
+    :param queue: The game queue.
+    :param with_history: Whether to keep every rating update. Without it the history is not recorded at all.
+    :return: (ratings by player id, names by player id, games played by player id, rating history), where the
+             history maps player ids to their [{"mu", "sigma"}] after each game, or is None without with_history.
+    """
+    ts, player_data, player_ratings = prepare_ratings(game_data, queue)
+    rating_history = process_rating_adjustment(ts, player_data, player_ratings, with_history)
+
+    return player_ratings, player_data['names'], player_data['games'], rating_history
@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from modules.data_managment import (fetch_data, get_cache_version, get_data_version, matches_data_version,
+                                     split_games_by_queue, save_queue_cache)
+from modules.rating_calculations import calculate_ratings
+
+# Queue -> QueueRatings, each queue with its own TrueSkill environment and ratings
+queue_states = {}
+
+
+class QueueRatings:
+    """A queue's games and the ratings replayed from them."""
+    def __init__(self, queue, game_data, version=None):
+        self.queue = queue
+        self.game_data = game_data
+        self.version = version
+        self.data_version = get_data_version(game_data)
+        self.ratings, self.names, self.games_played, _ = calculate_ratings(game_data, queue=queue)
+
+
+def update_queue_ratings(queue, game_data, version=None):
+    """
+    Bring a queue's ratings up to date with its games. The games are only replayed when they changed,
+    otherwise the state just takes the new list and cache version.
+    :param version: Cache version (get_cache_version) the games were read from or saved as.
+    """
+    state = queue_states.get(queue)
+    if state is not None and matches_data_version(game_data, state.data_version):
+        state.game_data = game_data
+        state.version = version
+        return state
+
+    state = queue_states[queue] = QueueRatings(queue, game_data, version)
+    print(f"Rated {len(game_data)} games for {queue} queue.")
+    return state
+
+
+def ingest_games(game_data, start_date, end_date):
+    """
+    Take one API payload through a single pass: split it into every queue's games, cache each queue
+    and update the queues' ratings. Queues whose games haven't changed keep their cache file as it is.
+    :return: {queue: games}
+    """
+    queue_games = split_games_by_queue(game_data, start_date, end_date)
+    for queue, games in queue_games.items():
+        state = queue_states.get(queue)
+        version = get_cache_version(queue)
+        if state is None or version is None or state.version != version or not matches_data_version(games, state.data_version):
+            save_queue_cache(queue, games)
+            version = get_cache_version(queue)
+        update_queue_ratings(queue, games, version)
+    return queue_games
+
+
+def get_queue_ratings(queue='NA'):
+    """The current QueueRatings for a queue, reading the queue's game cache only when it has changed."""
+    state = queue_states.get(queue)
+    version = get_cache_version(queue)
+    if state is not None and version is not None and state.version == version:
+        return state
+
+    game_data = fetch_data(datetime(2018, 1, 1), datetime.now(), queue)
+    return update_queue_ratings(queue, game_data, get_cache_version(queue))  # The fetch creates the cache if there was none
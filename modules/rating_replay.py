@@ -0,0 +1,164 @@
+import math
+from collections.abc import Mapping
+
+import numpy as np
+import trueskill
+
+
+class MatchTable:
+    """
+    The rateable matches of a game list as flat arrays of player indexes.
+    Match k's winners are winners[offsets[k]:offsets[k + 1]] and its losers the same slice of losers,
+    and it is game match_indexes[k] of the game list.
+    """
+    def __init__(self, winners, losers, offsets, match_indexes):
+        self.winners = np.array(winners, dtype=np.int32)
+        self.losers = np.array(losers, dtype=np.int32)
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.match_indexes = np.array(match_indexes, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.match_indexes)
+
+
+class RatingHistory:
+    """One entry per rating update, in replay order: the player index, the match (index into the game list) and the new rating."""
+    def __init__(self, players, matches, mu, sigma):
+        self.players = players
+        self.matches = matches
+        self.mu = mu
+        self.sigma = sigma
+
+    def __len__(self):
+        return len(self.players)
+
+
+class PlayerRatingHistory(Mapping):
+    """
+    Read-only {player id: [{"mu", "sigma"}, ...]} view of a RatingHistory. Nothing is grouped until the first
+    lookup, and each player's list is only built when it is asked for.
+    """
+    def __init__(self, history, player_ids):
+        self.history = history
+        self.player_ids = player_ids
+        self.player_index = {player_id: index for index, player_id in enumerate(player_ids)}
+        self.order = None
+        self.bounds = None
+        self.lists = {}
+
+    def group(self):
+        # A stable sort keeps each player's updates in replay order
+        self.order = np.argsort(self.history.players, kind='stable')
+        self.bounds = np.searchsorted(self.history.players[self.order], np.arange(len(self.player_ids) + 1))
+
+    def __getitem__(self, player_id):
+        if player_id in self.lists:
+            return self.lists[player_id]
+        if self.order is None:
+            self.group()
+        index = self.player_index[player_id]  # Raises KeyError for unknown players, like a dict
+        rows = self.order[self.bounds[index]:self.bounds[index + 1]]
+        entries = self.lists[player_id] = [{"mu": mu, "sigma": sigma} for mu, sigma in
+                                           zip(self.history.mu[rows].tolist(), self.history.sigma[rows].tolist())]
+        return entries
+
+    def __iter__(self):
+        return iter(self.player_ids)
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def __contains__(self, player_id):
+        return player_id in self.player_index
+
+
+def replay_ratings(table, mu, sigma, env, record_history=True, start=0, stop=None, checkpoints=None, checkpoint_interval=None,
+                   predictions=None):
+    """
+    Replay the matches of a MatchTable through the two-team TrueSkill update.
+
+    This is the closed form of what env.rate([winners, losers]) computes for two teams of unit weight,
+    including the dynamics factor (tau) and the draw margin. A match is skipped, like a FloatingPointError
+    from env.rate, when the W function falls outside (0, 1).
+
+    :param table: The MatchTable to replay.
+    :param mu: Mean of each player index, updated in place.
+    :param sigma: Standard deviation of each player index, updated in place.
+    :param env: The trueskill.TrueSkill environment.
+    :param record_history: Whether to return the RatingHistory of every update.
+    :param start: First match (position in the table) to replay, mu and sigma must be the ratings before it.
+    :param stop: Replay up to, not including, this match. Defaults to the end of the table.
+    :param checkpoints: Optional dict filled with {k: (mu, sigma)}, copies of the ratings before match k,
+                        for every k that is a multiple of checkpoint_interval.
+    :param checkpoint_interval: Matches between checkpoints.
+    :param predictions: Optional array filled with, for each replayed match k, the win_probability of its winners
+                        from the ratings before the match.
+    :return: The RatingHistory, or None.
+    """
+    cdf, pdf = env.cdf, env.pdf
+    beta_squared = env.beta ** 2
+    tau_squared = env.tau ** 2
+    draw_margins = {}
+
+    winners = table.winners.tolist()
+    losers = table.losers.tolist()
+    offsets = table.offsets.tolist()
+    match_indexes = table.match_indexes.tolist()
+    if stop is None:
+        stop = len(match_indexes)
+
+    if record_history:
+        capacity = 2 * (offsets[stop] - offsets[start])
+        history_players = np.empty(capacity, dtype=np.int32)
+        history_matches = np.empty(capacity, dtype=np.int64)
+        history_mu = np.empty(capacity, dtype=np.float64)
+        history_sigma = np.empty(capacity, dtype=np.float64)
+    position = 0
+
+    for k in range(start, stop):
+        if checkpoints is not None and k % checkpoint_interval == 0:
+            checkpoints[k] = (np.array(mu), np.array(sigma))
+
+        first, end = offsets[k], offsets[k + 1]
+        team_size = end - first
+        draw_margin = draw_margins.get(team_size)
+        if draw_margin is None:
+            draw_margin = draw_margins[team_size] = trueskill.calc_draw_margin(env.draw_probability, 2 * team_size, env)
+
+        mu_difference = 0.0
+        variance = 2 * team_size * beta_squared
+        for i in range(first, end):
+            winner, loser = winners[i], losers[i]
+            mu_difference += mu[winner] - mu[loser]
+            variance += sigma[winner] ** 2 + sigma[loser] ** 2 + 2 * tau_squared
+        c = math.sqrt(variance)
+        if predictions is not None:
+            # win_probability leaves out the dynamics factor
+            predictions[k] = cdf(mu_difference / math.sqrt(variance - 2 * team_size * tau_squared))
+
+        # trueskill's v_win and w_win
+        x = mu_difference / c - draw_margin / c
+        denominator = cdf(x)
+        v = pdf(x) / denominator if denominator else -x
+        w = v * (v + x)
+        if not 0 < w < 1:
+            continue
+
+        mean_step = v / c
+        variance_step = w / variance
+        for players, sign in ((winners, 1.0), (losers, -1.0)):
+            for i in range(first, end):
+                player = players[i]
+                prior_variance = sigma[player] ** 2 + tau_squared
+                mu[player] += sign * prior_variance * mean_step
+                sigma[player] = math.sqrt(prior_variance * (1 - prior_variance * variance_step))
+                if record_history:
+                    history_players[position] = player
+                    history_matches[position] = match_indexes[k]
+                    history_mu[position] = mu[player]
+                    history_sigma[position] = sigma[player]
+                    position += 1
+
+    if not record_history:
+        return None
+    return RatingHistory(history_players[:position], history_matches[:position], history_mu[:position], history_sigma[:position])
@@ -0,0 +1,95 @@
+import numpy as np
+import trueskill
+
+from modules.rating_calculations import prepare_ratings
+from modules.rating_engine import get_queue_ratings
+from modules.rating_replay import replay_ratings
+
+# Rated games between saved copies of everyone's ratings
+CHECKPOINT_INTERVAL = 500
+
+# Queue -> RatingTimeline for the queue's current games
+rating_timelines = {}
+
+
+class RatingTimeline:
+    """
+    One replay of a queue's games that can answer questions about past ratings without replaying everything.
+
+    The ratings before every CHECKPOINT_INTERVAL-th rated game are kept, so the ratings at any moment are the
+    nearest earlier checkpoint plus at most CHECKPOINT_INTERVAL games of replay. Every update is kept in the
+    flat RatingHistory log, which gives a player's trajectory directly.
+
+    Starting ratings use the pick order averages over all the games, so past ratings are the ratings as they
+    stood at that point of today's replay, not what a replay of only the games up to then would give.
+    """
+    def __init__(self, game_data, queue, version=None):
+        self.queue = queue
+        self.version = version
+        self.env, player_data, starting_ratings = prepare_ratings(game_data, queue)
+        self.player_ids = player_data['ids']
+        self.player_index = player_data['index']
+        self.names = player_data['names']
+        self.matches = player_data['matches']
+
+        self.game_timestamps = np.array([game['timestamp'] for game in game_data], dtype=np.int64)
+        # Games are replayed in list order, which is only oldest first within one queue (ALL is one queue after
+        # the other), so lookups by time use the latest start time so far to always land on a prefix of the replay
+        self.match_timestamps = np.maximum.accumulate(self.game_timestamps[self.matches.match_indexes])
+
+        self.starting_mu = [starting_ratings[player_id].mu for player_id in self.player_ids]
+        self.starting_sigma = [starting_ratings[player_id].sigma for player_id in self.player_ids]
+        self.mu, self.sigma = list(self.starting_mu), list(self.starting_sigma)
+        self.checkpoints = {}
+        self.history = replay_ratings(self.matches, self.mu, self.sigma, self.env, checkpoints=self.checkpoints,
+                                      checkpoint_interval=CHECKPOINT_INTERVAL)
+
+    def get_match_count(self, timestamp):
+        """Number of rated games, in replay order, up to the first one that started after timestamp (ms)."""
+        return int(np.searchsorted(self.match_timestamps, timestamp, side='right'))
+
+    def get_state_after(self, match_count):
+        """(mu, sigma) lists indexed like player_ids, after the first match_count rated games."""
+        if match_count >= len(self.matches):
+            return list(self.mu), list(self.sigma)
+
+        checkpoint = match_count - match_count % CHECKPOINT_INTERVAL
+        if checkpoint in self.checkpoints:
+            mu, sigma = (values.tolist() for values in self.checkpoints[checkpoint])
+        else:
+            checkpoint, mu, sigma = 0, list(self.starting_mu), list(self.starting_sigma)
+        replay_ratings(self.matches, mu, sigma, self.env, record_history=False, start=checkpoint, stop=match_count)
+        return mu, sigma
+
+    def get_ratings_as_of(self, timestamp):
+        """
+        Ratings of every player who had played a rated game by timestamp (ms), after the games that started by then.
+        :return: {player id: trueskill.Rating}
+        """
+        match_count = self.get_match_count(timestamp)
+        mu, sigma = self.get_state_after(match_count)
+        end = int(self.matches.offsets[match_count])
+        played = np.union1d(self.matches.winners[:end], self.matches.losers[:end])
+        return {self.player_ids[index]: trueskill.Rating(mu=mu[index], sigma=sigma[index]) for index in played.tolist()}
+
+    def get_player_trajectory(self, player_id):
+        """
+        A player's rating after each of their rated games, oldest first.
+        :return: (game timestamps in ms, mu, sigma) as NumPy arrays, empty for unknown players.
+        """
+        index = self.player_index.get(player_id)
+        if index is None:
+            return np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)
+        rows = np.flatnonzero(self.history.players == index)
+        return self.game_timestamps[self.history.matches[rows]], self.history.mu[rows], self.history.sigma[rows]
+
+
+def get_rating_timeline(queue='NA'):
+    """The RatingTimeline for a queue, rebuilt when the queue's games change."""
+    timeline = rating_timelines.get(queue)
+    queue_ratings = get_queue_ratings(queue)
+    if timeline is not None and timeline.version == queue_ratings.data_version:
+        return timeline
+
+    timeline = rating_timelines[queue] = RatingTimeline(queue_ratings.game_data, queue, queue_ratings.data_version)
+    return timeline
@@ -1,86 +1,269 @@
+import heapq
 import statistics
 import trueskill
+from collections import OrderedDict
 from itertools import combinations
-from queue import PriorityQueue
 from data.capper_data import capper_value_mapping
 
 CAPPER_PENALTY = 5
 DEVIATION_EXPONENT = 0 
 NEW_PLAYER_PENALTY = 20
+CAPPER_THRESHOLD = 1.5
+DEFAULT_RATING = trueskill.Rating(mu=9, sigma=3)
+
+# Number of rosters whose balanced teams are remembered
+BALANCE_CACHE_SIZE = 32
+# Upper bound on improving moves made by a local search
+LOCAL_SEARCH_ROUNDS = 50
+# Larger rosters are balanced with a local search, as every split can't be tried (and teams are capped at 7)
+MAX_EXHAUSTIVE_PLAYERS = 14
+
+# (sorted roster ids, captains, data version, capper values) -> [(team1 ids, team2 ids)], least recently used first
+balance_cache = OrderedDict()
 
 def generate_combinations(players, team_size):
     if team_size <= 0:
         return [[]]
     return list(combinations(players, team_size))
 
+class PlayerTable:
+    """
+    Per-player values used while balancing, looked up once per balance and stored in parallel lists
+    indexed by the player's position in the roster.
+    """
+    __slots__ = ('players', 'mu', 'rating_mu', 'is_new', 'capper_value')
+
+    def __init__(self, players, player_games, avg_picks, player_ratings):
+        self.players = players
+        self.mu = [player['mu'] for player in players]
+        self.rating_mu = [player_ratings.get(player['id'], DEFAULT_RATING).mu for player in players]
+        # New players: fewer than 100 games and usually picked late
+        self.is_new = [player_games.get(player['id'], 0) < 100 and avg_picks.get(player['id'], 0) > 8 for player in players]
+        self.capper_value = [capper_value_mapping.get(player['id'], 0) for player in players]
+
+    def __len__(self):
+        return len(self.players)
+
+
+def get_deviation_penalty(table, team, mean_rating):
+    """Penalty based on how far a team's rating spread is from the mean rating."""
+    if DEVIATION_EXPONENT == 0:
+        # x ** 0 is 1 for any spread, so skip the stdev, but still reject teams it is undefined for
+        if len(team) < 2:
+            raise statistics.StatisticsError('stdev requires at least two data points')
+        return 1.0
+    std_dev = statistics.stdev(table.rating_mu[i] for i in team)
+    return (std_dev - mean_rating) ** DEVIATION_EXPONENT
+
+
+def score_split(table, team1, team2, mean_rating):
+    """
+    Returns the imbalance of a split (lower is better).
+
+    :param table: PlayerTable for the roster.
+    :param team1: Roster positions of the first team's players.
+    :param team2: Roster positions of the second team's players.
+    :param mean_rating: Mean mu of the roster.
+    """
+    penalty_team1 = get_deviation_penalty(table, team1, mean_rating)
+    penalty_team2 = get_deviation_penalty(table, team2, mean_rating)
+
+    # Compute new player imbalance
+    new_players_team1 = sum(1 for i in team1 if table.is_new[i])
+    new_players_team2 = sum(1 for i in team2 if table.is_new[i])
+    new_player_imbalance = NEW_PLAYER_PENALTY * abs(new_players_team1 - new_players_team2)
+
+    # Introduce a penalty if the total capper value for a team exceeds a threshold
+    if sum(table.capper_value[i] for i in team1) > CAPPER_THRESHOLD:
+        new_player_imbalance += CAPPER_PENALTY
+    if sum(table.capper_value[i] for i in team2) > CAPPER_THRESHOLD:
+        new_player_imbalance += CAPPER_PENALTY
+
+    return (abs(sum(table.mu[i] for i in team1) - sum(table.mu[i] for i in team2)) +
+            penalty_team1 + penalty_team2 + new_player_imbalance)
+
+
 def balance_teams(players, captains, player_games, avg_picks, player_ratings):
-    best_teams = PriorityQueue()
-    
-    locked_team1_players = [player for player in players if player['id'] == captains[0]]
-    locked_team2_players = [player for player in players if player['id'] == captains[1]]
-    unlocked_players = [player for player in players if player not in locked_team1_players + locked_team2_players]
-    
+    """
+    Tries every split of the roster with the captains on opposite teams and returns the 3 best,
+    best first, as dicts with 'team1' and 'team2' player lists.
+    """
+    table = PlayerTable(players, player_games, avg_picks, player_ratings)
+
+    locked_team1_players = [i for i, player in enumerate(players) if player['id'] == captains[0]]
+    locked_team2_players = [i for i, player in enumerate(players) if player['id'] == captains[1]]
+    locked = set(locked_team1_players + locked_team2_players)
+    unlocked_players = [i for i in range(len(players)) if i not in locked]
+
     max_team_size = min(7, len(players) // 2)
-    
-    counter = 0  # Initialize a counter for unique differences
-    mean_rating = sum(player['mu'] for player in players) / len(players)
-    
+    mean_rating = sum(table.mu) / len(players)
+
+    # Max-heap (via negated differences) of the 3 best splits. The counter breaks ties in favour of earlier splits.
+    best_teams = []
+    counter = 0
+
     for team_size in range(len(locked_team1_players), max_team_size + 1):
-        team1_combinations = generate_combinations(unlocked_players, team_size - len(locked_team1_players))
-        
-        for team1_unlocked in team1_combinations:
+        for team1_unlocked in generate_combinations(unlocked_players, team_size - len(locked_team1_players)):
             full_team1 = locked_team1_players + list(team1_unlocked)
-            team2 = locked_team2_players + [player for player in unlocked_players if player not in team1_unlocked]
-            
+            chosen = set(team1_unlocked)
+            team2 = locked_team2_players + [i for i in unlocked_players if i not in chosen]
+
             if abs(len(full_team1) - len(team2)) > 1:
                 continue
-            
-            # Compute the standard deviation for each team's ratings
-            std_dev_team1 = statistics.stdev(player_ratings.get(player['id'], trueskill.Rating(mu=9, sigma=3)).mu for player in full_team1)
-            std_dev_team2 = statistics.stdev(player_ratings.get(player['id'], trueskill.Rating(mu=9, sigma=3)).mu for player in team2)
-            
-            # Compute a penalty based on the deviation from the mean rating
-            penalty_team1 = (std_dev_team1 - mean_rating) ** DEVIATION_EXPONENT
-            penalty_team2 = (std_dev_team2 - mean_rating) ** DEVIATION_EXPONENT
-            
-            # Compute new player imbalance
-            new_players_team1 = sum(1 for player in full_team1 if player_games.get(player['id'], 0) < 100 and avg_picks.get(player['id'], 0) > 8)
-            new_players_team2 = sum(1 for player in team2 if player_games.get(player['id'], 0) < 100 and avg_picks.get(player['id'], 0) > 8)
-            
-            new_player_imbalance = NEW_PLAYER_PENALTY * abs(new_players_team1 - new_players_team2)
-            
-            # Calculate the total capper value for each team
-            total_capper_value_team1 = sum(capper_value_mapping.get(player['id'], 0) for player in full_team1)
-            total_capper_value_team2 = sum(capper_value_mapping.get(player['id'], 0) for player in team2)
-
-            # Introduce a penalty if the total capper value for a team exceeds a threshold
-            if total_capper_value_team1 > 1.5:
-                new_player_imbalance += CAPPER_PENALTY
-            if total_capper_value_team2 > 1.5:
-                new_player_imbalance += CAPPER_PENALTY
-
-            difference = (abs(sum(player['mu'] for player in full_team1) - sum(player['mu'] for player in team2)) + 
-                          penalty_team1 + penalty_team2 + new_player_imbalance)
-            
-            # Check if teams are within 4% of a 50/50 balance
-            total_rating = sum(player['mu'] for player in players)
-            team1_rating_percentage = sum(player['mu'] for player in full_team1) / total_rating
-            if 0.47 <= team1_rating_percentage <= 0.53:
-                # Reduce the penalties
-                penalty_team1 /= 2
-                penalty_team2 /= 2
-                new_player_imbalance /= 2
-            
+
             # Add a tiny unique value to the difference
-            difference += counter * 1e-10
+            difference = score_split(table, full_team1, team2, mean_rating) + counter * 1e-10
             counter += 1
 
-            # Negative difference because PriorityQueue is a min-heap and we want max difference at the top
-            if best_teams.qsize() < 5 or -difference > best_teams.queue[0][0]:
-                best_teams.put((-difference, {'team1': full_team1, 'team2': team2}))
-                
-                # If we have more than 5 items in the queue, remove the smallest one
-                if best_teams.qsize() > 3:
-                    best_teams.get()
-                    
-    return [best_teams.get()[1] for _ in range(min(5, best_teams.qsize()))][::-1]
\ No newline at end of file
+            heapq.heappush(best_teams, (-difference, full_team1, team2))
+            if len(best_teams) > 3:
+                heapq.heappop(best_teams)
+
+    return [{'team1': [players[i] for i in team1], 'team2': [players[i] for i in team2]}
+            for _, team1, team2 in sorted(best_teams, reverse=True)]
+
+
+def order_team(team, locked):
+    """Captain first, then the rest in roster order, matching the team lists balance_teams returns."""
+    return sorted(team, key=lambda i: (i not in locked, i))
+
+
+def get_neighbours(team1, team2, locked, swap_size=1):
+    """
+    Splits one move away. A move swaps swap_size players between the teams; with swap_size 1 it can
+    also send a player from the larger team to the smaller one.
+    """
+    movable1 = [i for i in team1 if i not in locked]
+    movable2 = [i for i in team2 if i not in locked]
+    for out1 in combinations(movable1, swap_size):
+        for out2 in combinations(movable2, swap_size):
+            yield ([k for k in team1 if k not in out1] + list(out2),
+                   [k for k in team2 if k not in out2] + list(out1))
+    if swap_size == 1:
+        if len(team1) > len(team2):
+            for i in movable1:
+                yield [k for k in team1 if k != i], team2 + [i]
+        elif len(team2) > len(team1):
+            for j in movable2:
+                yield team1 + [j], [k for k in team2 if k != j]
+
+
+def local_search(table, team1, team2, locked, mean_rating, top_n=3, max_rounds=LOCAL_SEARCH_ROUNDS, swap_sizes=(1, 2)):
+    """
+    Steepest descent from the given split, scored with score_split. Each round takes the best improving
+    single swap, and only looks at the larger double swap neighbourhood when no single swap improves.
+    Stops when no move improves. Returns the top_n best splits seen as (score, team1, team2), best first.
+    """
+    seen = {}
+
+    def evaluate(candidate1, candidate2):
+        key = tuple(sorted(candidate1))
+        if key not in seen:
+            seen[key] = (score_split(table, candidate1, candidate2, mean_rating), candidate1, candidate2)
+        return seen[key][0]
+
+    current = evaluate(team1, team2)
+    for _ in range(max_rounds):
+        best_move = None
+        for swap_size in swap_sizes:
+            for candidate1, candidate2 in get_neighbours(team1, team2, locked, swap_size):
+                score = evaluate(candidate1, candidate2)
+                if score < current and (best_move is None or score < best_move[0]):
+                    best_move = (score, candidate1, candidate2)
+            if best_move:
+                break
+        if best_move is None:
+            break
+        current, team1, team2 = best_move
+
+    best = sorted(seen.items(), key=lambda item: (item[1][0], item[0]))[:top_n]
+    return [(score, order_team(candidate1, locked), order_team(candidate2, locked)) for _, (score, candidate1, candidate2) in best]
+
+
+def get_initial_split(players, captains):
+    """
+    Greedy starting split for a local search: captains on their teams, then every other player,
+    highest mu first, joins the team with the lower total that still has room.
+    Returns (team1 ids, team2 ids).
+    """
+    team1, team2 = [captains[0]], [captains[1]]
+    totals = {1: 0.0, 2: 0.0}
+    by_id = {player['id']: player for player in players}
+    for captain, team in ((captains[0], 1), (captains[1], 2)):
+        totals[team] += by_id[captain]['mu'] if captain in by_id else 0
+
+    max_size = (len(players) + 1) // 2
+    for player in sorted((p for p in players if p['id'] not in captains), key=lambda p: p['mu'], reverse=True):
+        team = 1 if totals[1] <= totals[2] else 2
+        if len(team1 if team == 1 else team2) >= max_size:
+            team = 3 - team
+        (team1 if team == 1 else team2).append(player['id'])
+        totals[team] += player['mu']
+    return team1, team2
+
+
+def rebalance_teams(players, captains, team1_ids, team2_ids, player_games, avg_picks, player_ratings, top_n=3):
+    """
+    Like balance_teams, but improves an existing split with a local search instead of trying every split.
+    Takes milliseconds, and works for any roster size.
+
+    :param team1_ids: Ids of the players starting on team 1 (with captains[0]).
+    :param team2_ids: Ids of the players starting on team 2 (with captains[1]).
+    """
+    table = PlayerTable(players, player_games, avg_picks, player_ratings)
+    position = {player['id']: i for i, player in enumerate(players)}
+    locked = {position[captain] for captain in captains if captain in position}
+    team1 = [position[player_id] for player_id in team1_ids]
+    team2 = [position[player_id] for player_id in team2_ids]
+    mean_rating = sum(table.mu) / len(players)
+
+    return [{'team1': [players[i] for i in candidate1], 'team2': [players[i] for i in candidate2]}
+            for _, candidate1, candidate2 in local_search(table, team1, team2, locked, mean_rating, top_n)]
+
+
+def get_balance_cache_key(players, captains, version):
+    roster = tuple(sorted(player['id'] for player in players))
+    # Capper values are part of the key, since !setcapvalue changes the best split without changing the data
+    return roster, tuple(captains), version, tuple(capper_value_mapping.get(player_id, 0) for player_id in roster)
+
+
+def get_cached_balance(players, captains, version):
+    """Returns the cached balanced teams for this roster, built from the given player dicts, or None."""
+    key = get_balance_cache_key(players, captains, version)
+    if key not in balance_cache:
+        return None
+    balance_cache.move_to_end(key)
+    by_id = {player['id']: player for player in players}
+    return [{'team1': [by_id[i] for i in team1], 'team2': [by_id[i] for i in team2]} for team1, team2 in balance_cache[key]]
+
+
+def store_balance(players, captains, version, balanced_teams_list):
+    key = get_balance_cache_key(players, captains, version)
+    balance_cache[key] = [([player['id'] for player in teams['team1']], [player['id'] for player in teams['team2']])
+                          for teams in balanced_teams_list]
+    balance_cache.move_to_end(key)
+    while len(balance_cache) > BALANCE_CACHE_SIZE:
+        balance_cache.popitem(last=False)
+
+
+def find_substitution_seed(players, captains, version):
+    """
+    Looks for a cached roster that differs from this one by a single substituted player, and returns its
+    best split with the substitute in place as (team1 ids, team2 ids), or None.
+    """
+    roster = {player['id'] for player in players}
+    for (cached_roster, _, cached_version, _), splits in reversed(balance_cache.items()):
+        if cached_version != version or len(cached_roster) != len(roster):
+            continue
+        removed = set(cached_roster) - roster
+        added = roster - set(cached_roster)
+        if len(removed) != 1 or len(added) != 1:
+            continue
+
+        old_id, new_id = removed.pop(), added.pop()
+        team1, team2 = ([new_id if i == old_id else i for i in team] for team in splits[0])
+        if captains[0] in team2 and captains[1] in team1:
+            team1, team2 = team2, team1
+        if captains[0] in team1 and captains[1] in team2:
+            return team1, team2
+    return None
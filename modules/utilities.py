@@ -10,17 +10,20 @@ import random
 
 # Bot Data
 from data.player_mappings import player_name_mapping
-from data.map_url_mapping import map_url_mapping
 from data.user_roles import bot_admins
-from data.map_commands import map_commands, map_commands_arena
 from data.shared_data import (last_messages, most_recent_matched_ids, matched_results_store, substitution_store, game_history_cache)
 
 # Bot Modules
-from modules.data_managment import fetch_data
-from modules.rating_calculations import (calculate_ratings, compute_avg_picks, initialize_player_data, process_matches)
-from modules.team_logic import balance_teams
+from modules.data_managment import get_data_version
+from modules.rating_calculations import (compute_avg_picks, aggregate_player_data)
+from modules.rating_engine import get_queue_ratings
+from modules.team_logic import (MAX_EXHAUSTIVE_PLAYERS, balance_teams, rebalance_teams, get_initial_split,
+                                find_substitution_seed, get_cached_balance, store_balance)
 from modules.embeds_formatting import create_embed
-from modules.data_managment import load_from_bson
+from modules.map_history import get_recent_maps, record_map_message
+from modules.map_sampler import sample_maps
+from modules.map_catalog import get_map_url, get_map_names, resolve_map_shortcut
+from modules.member_index import get_member_index, get_user_id_by_name
 
 # ==============================
 # CONFIGURATION
@@ -31,44 +34,21 @@ BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 CACHE_DIR = os.path.join(BASE_DIR, 'cache', 'gamequeue')
 DATA_DIR = os.path.join(BASE_DIR, 'data', 'gamequeue')
 
-# Command mapping
-reverse_map_commands = {v: k for k, v in map_commands.items()}
-
-# Load map_weights from BSON file
-map_weights = load_from_bson(os.path.join(DATA_DIR, 'map_weights.bson'))
-
-# Random map selection based on weights
-maps, weights = zip(*map_weights.items())
-selected_map = random.choices(maps, weights, k=1)[0]
-
-
 # Configuration File Parsing
 config = configparser.ConfigParser()
 try:
     config.read('config.ini')
     MIN_REACTIONS = int(config['Constants']['MIN_REACTIONS'])
     MIN_REACTIONS_MAP = int(config['Constants']['MIN_REACTIONS_MAP'])
-except (configparser.Error, KeyError) as e:
+    # Weight multipliers for the most recent, second most recent, ... maps (0 excludes the map)
+    MAP_RECENCY_DECAY = [float(value) for value in config['Constants'].get('MAP_RECENCY_DECAY', '0, 0').split(',')]
+except (configparser.Error, KeyError, ValueError) as e:
     raise SystemExit("Error reading configuration file.") from e
 
 # ==============================
 # FUNCTIONS
 # ==============================
 
-def get_user_id_by_name(guild, username):
-    """
-    Retrieves the user ID based on the provided username or display name.
-
-    :param guild: Discord guild object.
-    :param username: The name or display name of the user.
-    :return: User ID if found, else None.
-    """
-    member = discord.utils.get(guild.members, name=username) or discord.utils.get(guild.members, display_name=username)
-    if member:
-        return member.id
-    return None
-
-
 async def check_bot_admin(ctx):
     """
     Checks if the context's author is a bot admin.
@@ -81,12 +61,12 @@ async def check_bot_admin(ctx):
     return True
 
 
-async def check_substitution(bot, message, start_date, end_date):
+async def check_substitution(bot, message):
     """
     Checks if a substitution message is detected
     """
     if message.content.startswith("`") and " has been substituted with " in message.content and message.content.endswith("`"):
-        return await handle_substitution(bot, message, start_date, end_date)
+        return await handle_substitution(bot, message)
 
 
 async def check_2v2_game_start(message, embed):
@@ -101,13 +81,13 @@ async def check_2v2_game_start(message, embed):
     return False
 
 
-async def check_pug_game_start(bot, message, embed, start_date, end_date):
+async def check_pug_game_start(bot, message, embed):
     """
     Detects and handles PUG game start based on the embed description.
     """
     if embed.description and "Captains:" in embed.description:
-        data = fetch_data(start_date, end_date, 'NA')
-        player_ratings, _, _, _ = calculate_ratings(data, queue='NA')
+        queue_ratings = get_queue_ratings('NA')
+        data, player_ratings = queue_ratings.game_data, queue_ratings.ratings
         matched_results = await match_ids(message.channel, embed)
         captains = matched_results.get('captains', [])
 
@@ -129,7 +109,7 @@ async def check_pug_game_start(bot, message, embed, start_date, end_date):
             players.append({'id': user_id, 'name': name, 'mu': player_ratings.get(user_id, default_rating).mu})
 
         matched_results_store[message.channel.id] = matched_results
-        await send_balanced_teams(bot, message.channel, players, player_ratings, captains, data)
+        await send_balanced_teams(bot, message.channel, players, player_ratings, captains, data, queue_ratings.data_version)
 
 
 async def check_map_start(message, embed):
@@ -139,21 +119,14 @@ async def check_map_start(message, embed):
     from cogs.server_management import start_map
     description = embed.description
     if description and "**Maps:**" in description:
-        map_name = description.split("**Maps:**")[1].strip().lower()  # Convert map name to lowercase
+        # Keep the channel's recent map history current, so map selection never has to walk the channel
+        record_map_message(message)
 
-        # First try exact match
-        map_shortcut = [shortcut for shortcut, full_name in map_commands.items() if map_name == full_name.lower()]
-        if not map_shortcut:
-            map_shortcut = [shortcut for shortcut, full_name in map_commands_arena.items() if map_name == full_name.lower()]
-        
-        # If exact match not found, try starts with
-        if not map_shortcut:
-            map_shortcut = [shortcut for shortcut, full_name in map_commands.items() if map_name.startswith(full_name.lower())]
-        if not map_shortcut:
-            map_shortcut = [shortcut for shortcut, full_name in map_commands_arena.items() if map_name.startswith(full_name.lower())]
+        map_name = description.split("**Maps:**")[1].strip()
+        map_shortcut = resolve_map_shortcut(map_name)
 
         if map_shortcut:
-            await start_map(message.channel, map_shortcut[0])  # Start the detected map
+            await start_map(message.channel, map_shortcut)  # Start the detected map
 
 
 
@@ -191,12 +164,8 @@ async def match_ids(channel, embed):
                 
     content_string = content_string.replace('Captains:', '').strip()
 
-    # Create a dictionary mapping display names and usernames to their ids for all members of the guild
-    members_names = {member.display_name: member.id for member in channel.guild.members}
-    members_usernames = {member.name: member.id for member in channel.guild.members}
-    
-    # Merge the two dictionaries
-    members_names.update(members_usernames)
+    # Display names, usernames and mapped player names, kept up to date by the member events
+    member_index = get_member_index(channel.guild)
 
     # Split by commas and strip whitespace to get potential full names
     potential_names = [name.strip() for name in content_string.split(',')]
@@ -208,11 +177,20 @@ async def match_ids(channel, embed):
             matched_ids.append(f"{word} ({user_id})")
             content_string = content_string.replace(word, '', 1)
 
-    # Match by substring only if not matched as a full name
-    for name, member_id in members_names.items():
-        if name in content_string and f"{name} ({member_id})" not in matched_ids:
+    # Match the remaining text by substring in a single pass, taking the leftmost and then longest name
+    matched_user_ids = {int(re.search(r'\((\d+)\)', user_id_str).group(1)) for user_id_str in matched_ids}
+    remaining_parts = []
+    last_end = 0
+    for start, end, name, member_id in member_index.find_names(content_string):
+        if member_id is None:
+            continue
+        if member_id not in matched_user_ids:
             matched_strings.append(f"{name} ({member_id})")
-            content_string = content_string.replace(name, '', 1)
+            matched_user_ids.add(member_id)
+        remaining_parts.append(content_string[last_end:start])
+        last_end = end
+    remaining_parts.append(content_string[last_end:])
+    content_string = ' '.join(remaining_parts)
             
     # Find unmatched names
     for word in regex_split.split(content_string.strip()):
@@ -231,90 +209,30 @@ async def match_ids(channel, embed):
 
 async def initialize_data(data):
     game_data = data  # Replace with the actual game data
-    player_data = initialize_player_data(game_data)
-    process_matches(game_data, player_data)
+    player_data = aggregate_player_data(game_data)
     avg_picks = compute_avg_picks(player_data['picks'])
     return player_data, avg_picks
 
-def get_balanced_teams_list(players, captains, player_data, avg_picks, player_ratings):
-    balanced_teams_list = balance_teams(players, captains, player_data['games'], avg_picks, player_ratings)
+def get_balanced_teams_list(players, captains, player_data, avg_picks, player_ratings, version=None):
+    # After a one player substitution, improve the previous best split rather than starting over
+    seed = find_substitution_seed(players, captains, version) if version else None
+    if not seed and len(players) > MAX_EXHAUSTIVE_PLAYERS:
+        seed = get_initial_split(players, captains)
+    if seed:
+        balanced_teams_list = rebalance_teams(players, captains, *seed, player_data['games'], avg_picks, player_ratings)
+    else:
+        balanced_teams_list = balance_teams(players, captains, player_data['games'], avg_picks, player_ratings)
     if not balanced_teams_list or len(balanced_teams_list) <= 1:
         print("Could not find balanced teams.")
         return None
+    if version:
+        store_balance(players, captains, version, balanced_teams_list)
     return balanced_teams_list
 
-async def get_last_two_maps(channel):
-    number_of_maps = 2
-    maps = await parse_game_history_from_channel(channel, number_of_maps)
-    if not maps:
-        return None, None
-
-    most_recent_map = maps[0]["name"]
-    second_recent_map = maps[1]["name"] if len(maps) > 1 else None
-
-    print(most_recent_map)
-    print(second_recent_map)
-
-    return most_recent_map, second_recent_map
-
-
-async def parse_game_history_from_channel(channel, limit):
-    maps = []
-    last_message_id = None
-    continue_search = True
-
-    while len(maps) < limit and continue_search:
-        if last_message_id:
-            history = channel.history(limit=100, before=discord.Object(id=last_message_id))
-        else:
-            history = channel.history(limit=100)
-
-        fetched_messages = 0
-        async for message in history:
-            fetched_messages += 1
-
-            if len(maps) == limit:  # Stop once we have enough
-                break
-            if message.embeds:
-                embed = message.embeds[0]
-                description = embed.description
-                if description and "**Maps:**" in description:
-                    map_name = description.split("**Maps:**")[1].strip()
-                    naive_datetime = message.created_at.replace(tzinfo=None)
-                    maps.append({"name": map_name, "date": naive_datetime})  # Store entire datetime
-
-            last_message_id = message.id
-
-        # If the loop didn't break due to the limit and we didn't fetch a full 100 messages, 
-        # it means there's no more history
-        if fetched_messages < 100:
-            continue_search = False
-
-    return maps
-
 async def select_maps(channel):
-    most_recent, second_recent = await get_last_two_maps(channel)
-    
-    available_maps = []
-    weights_adjusted = []
-
-    for map_name, weight in map_weights.items():
-        if map_name.lower().replace(" ", "") != most_recent:  # Exclude the most recent map
-            available_maps.append(map_name)
-            if map_name.lower().replace(" ", "") == second_recent:  # Adjust weight for the second most recent map
-                weights_adjusted.append(weight * 0.5)
-            else:
-                weights_adjusted.append(weight)
-
-    # Randomly select two maps
-    selected_maps = random.choices(available_maps, weights_adjusted, k=2)
-    while (selected_maps[0].lower().replace(" ", "") in [most_recent, second_recent]
-           or selected_maps[1].lower().replace(" ", "") in [most_recent, second_recent]
-           or selected_maps[0] == selected_maps[1]):
-        selected_maps = random.choices(available_maps, weights_adjusted, k=2)
-
-    current_map, next_map = selected_maps
-    map_url = map_url_mapping.get(current_map, map_url_mapping["N/A"])
+    recent_maps = await get_recent_maps(channel, len(MAP_RECENCY_DECAY))
+    current_map, next_map = sample_maps(2, [map_data["name"] for map_data in recent_maps], MAP_RECENCY_DECAY)
+    map_url = get_map_url(current_map)
     return current_map, next_map, map_url
 
 
@@ -326,12 +244,17 @@ async def send_initial_embed(channel, balanced_teams, captains, player_ratings,
     return msg
 
 
-async def send_balanced_teams(bot, channel, players, player_ratings, captains, data):
+async def send_balanced_teams(bot, channel, players, player_ratings, captains, data, version=None):
     try:
-        player_data, avg_picks = await initialize_data(data)
-        balanced_teams_list = get_balanced_teams_list(players, captains, player_data, avg_picks, player_ratings)
+        # The same roster on the same data balances the same way, e.g. when a game is restarted
+        if version is None:
+            version = get_data_version(data)
+        balanced_teams_list = get_cached_balance(players, captains, version)
         if not balanced_teams_list:
-            return
+            player_data, avg_picks = await initialize_data(data)
+            balanced_teams_list = get_balanced_teams_list(players, captains, player_data, avg_picks, player_ratings, version)
+            if not balanced_teams_list:
+                return
 
         current_map, next_map, map_url = await select_maps(channel)
         msg = await send_initial_embed(channel, balanced_teams_list[0], captains, player_ratings, current_map, map_url, next_map)
@@ -343,6 +266,8 @@ async def send_balanced_teams(bot, channel, players, player_ratings, captains, d
 
 async def handle_reactions(bot, msg, players, captains, player_ratings, current_map, next_map, balanced_teams_list):
     player_ids = set(player['id'] for player in players)
+    map_url = get_map_url(current_map)
+    balanced_teams = balanced_teams_list[0]
     map_voters = set()
     next_index = 1
     map_changed = False
@@ -372,8 +297,8 @@ async def handle_reactions(bot, msg, players, captains, player_ratings, current_
             map_voters.add(user.id)
             if reaction.count-1 >= MIN_REACTIONS_MAP and not map_changed:
                 map_changed = True
-                current_map, next_map = next_map, random.choice([map_ for map_ in maps if map_ != current_map])
-                map_url = map_url_mapping.get(current_map)
+                current_map, next_map = next_map, random.choice([map_ for map_ in get_map_names() if map_ != current_map])
+                map_url = get_map_url(current_map)
 
                 if next_index == 1:
                     title = 'Suggested Teams'
@@ -385,7 +310,7 @@ async def handle_reactions(bot, msg, players, captains, player_ratings, current_
                 await msg.clear_reactions()
                 await msg.add_reaction('🔁')
 
-async def handle_substitution(bot, message, start_date, end_date):
+async def handle_substitution(bot, message):
     # Extract player names from the substitution message
     player_names = re.findall(r'`([^`]+) has been substituted with ([^`]+)`', message.content)
     if not player_names:
@@ -424,8 +349,8 @@ async def handle_substitution(bot, message, start_date, end_date):
         most_recent_matched_ids[channel_id] = matched_results
 
         # Retrieve the required data again and create a new balanced match embed
-        data = fetch_data(start_date, end_date, 'NA')
-        player_ratings, _, _, _ = calculate_ratings(data, queue='NA')
+        queue_ratings = get_queue_ratings('NA')
+        data, player_ratings = queue_ratings.game_data, queue_ratings.ratings
         players = []
         for user_id_str in matched_ids + matched_results.get('matched_strings', []):
             user_id = int(re.search(r'\((\d+)\)', user_id_str).group(1))
@@ -436,4 +361,4 @@ async def handle_substitution(bot, message, start_date, end_date):
             default_rating = trueskill.Rating(mu=15, sigma=5)
             players.append({'id': user_id, 'name': name, 'mu': player_ratings.get(user_id, default_rating).mu})
 
-        await send_balanced_teams(bot, message.channel, players, player_ratings, captains, data)
+        await send_balanced_teams(bot, message.channel, players, player_ratings, captains, data, queue_ratings.data_version)
@@ -1,6 +1,6 @@
 # Standard Libraries
+import os
 import configparser
-from datetime import datetime
 
 # Third-party Libraries
 import discord
@@ -8,13 +8,17 @@ import aiohttp
 from discord.ext import commands
 
 # Bot Data
-from data.shared_data import (last_messages)
+from data.shared_data import (last_messages, game_history_cache)
 
 # Bot Modules
 from modules.utilities import (check_substitution, 
                                check_2v2_game_start, 
                                check_map_start, 
                                check_pug_game_start)
+from modules.map_history import load_map_history, backfill_map_history
+from modules.member_index import update_member, remove_member
+from modules.player_registry import load_player_registry
+from modules.data_managment import load_from_bson
 
 # Bot Cogs
 from cogs.utilities import UtilitiesCog
@@ -32,6 +36,9 @@ from cogs.pug_queue import PugQueueCog
 # CONFIGURATION
 # ==============================
 
+# File Paths
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+
 # Configuration File Parsing
 config = configparser.ConfigParser()
 try:
@@ -68,6 +75,9 @@ async def on_ready():
     #         else:
     #             print("Failed to fetch the avatar image.")
 
+    # Player names and capper values, kept in data/player_registry.jsonl
+    load_player_registry()
+
     # Add cogs to bot
     await bot.add_cog(UtilitiesCog(bot))
     await bot.add_cog(DebugsCog(bot))
@@ -79,6 +89,42 @@ async def on_ready():
     # await bot.add_cog(QueueCog(bot))
     await bot.add_cog(PugQueueCog(bot))
 
+    # Fill the recent map history once, later maps are recorded as their embeds appear
+    load_map_history()
+    pug_channels = load_from_bson(os.path.join(BASE_DIR, 'data', 'gamequeue', 'pug_channel.bson'))
+    channel_ids = {int(channel_id) for channel_id in pug_channels.values()} | set(game_history_cache.keys())
+    for channel_id in channel_ids:
+        channel = bot.get_channel(channel_id)
+        if channel:
+            await backfill_map_history(channel)
+
+
+@bot.event
+async def on_member_join(member):
+    update_member(member)
+
+
+@bot.event
+async def on_member_remove(member):
+    remove_member(member)
+
+
+@bot.event
+async def on_member_update(before, after):
+    # Nickname changes
+    if before.display_name != after.display_name or before.name != after.name:
+        update_member(after)
+
+
+@bot.event
+async def on_user_update(before, after):
+    # Username and global display name changes apply to every guild the user shares with the bot
+    if before.name != after.name or before.display_name != after.display_name:
+        for guild in bot.guilds:
+            member = guild.get_member(after.id)
+            if member:
+                update_member(member)
+
 
 @bot.event
 async def on_message(message):
@@ -87,10 +133,7 @@ async def on_message(message):
     # Update the last message for the channel
     last_messages[message.channel.id] = message.content
 
-    end_date = datetime.now()
-    start_date = datetime(2018, 1, 1)
-
-    await check_substitution(bot, message, start_date, end_date)
+    await check_substitution(bot, message)
 
     if message.embeds:
         embed = message.embeds[0]
@@ -98,7 +141,7 @@ async def on_message(message):
         if await check_2v2_game_start(message, embed):
             return
         
-        await check_pug_game_start(bot, message, embed, start_date, end_date)
+        await check_pug_game_start(bot, message, embed)
         await check_map_start(message, embed)
 
 